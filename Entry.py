@@ -1,13 +1,45 @@
 # Entry.py
 
+import sys
+
+class DialogueText:
+    """
+    The raw and cleaned text of one dialogue line. Entries for the same line,
+    such as one per Player voice, share a single DialogueText.
+    """
+    __slots__ = ('raw', 'clean')
+
+    def __init__(self, raw='', clean=None):
+        self.raw = raw
+        # Most lines need no cleaning; keep one string rather than two equal ones
+        self.clean = raw if clean == raw else clean
+
 class Entry:
-    def __init__(self, entrytag, voiceID=None, voiceName=None, rawText=''):
+    __slots__ = ('entrytag', 'voiceID', 'voiceName', 'text', 'characterName')
+
+    def __init__(self, entrytag, voiceID=None, voiceName=None, rawText='', text=None):
+        """
+        Args:
+            entrytag (str): The entry tag, e.g. '34_Toppo_1'.
+            voiceID (str): The voice used to synthesize the line.
+            voiceName (str): The display name of that voice.
+            rawText (str): The dialogue text as exported. Ignored when text is given.
+            text (DialogueText): Optional. A text record to share with other entries for the same line.
+        """
         self.entrytag = entrytag
         self.voiceID = voiceID
         self.voiceName = voiceName
-        self.rawText = rawText
-        self.cleanText = None  # to be set after cleaning
-        self.characterName = self.getName()
+        self.text = text if text is not None else DialogueText(rawText)
+        # Interned so that the entries of each character share one name string
+        self.characterName = sys.intern(self.getName())
+
+    @property
+    def rawText(self):
+        return self.text.raw
+
+    @property
+    def cleanText(self):
+        return self.text.clean
 
     def getTag(self):
         return self.entrytag
@@ -19,13 +51,14 @@ class Entry:
         return self.voiceName
 
     def getRawText(self):
-        return self.rawText
+        return self.text.raw
 
     def getCleanText(self):
-        return self.cleanText
+        return self.text.clean
 
     def setCleanText(self, cleanText):
-        self.cleanText = cleanText
+        # Other entries may share the text record, so this entry gets a record of its own
+        self.text = DialogueText(self.text.raw, cleanText)
 
     def getName(self):
         """
@@ -1,21 +1,87 @@
 # app.py
 
+import hashlib
+import io
+import json
 import os
-import requests
+import shutil
+import tempfile
 import threading
+import requests
+import time
 import uuid
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, Response, jsonify, stream_with_context
 from flask_session import Session
-from zipfile import ZipFile
 from werkzeug.utils import secure_filename
-from parsing_functions import parse_dialogue_csv
 from Entry import Entry
+from synthesis import SynthesisEngine
+from audio_post import AudioPostProcessor, create_pool, postprocessing_available
+from audio_cache import AudioCache
+from rate_limit import RetryPolicy
+from http_client import HTTPClient
+from voice_catalog import VoiceCatalog
+from parsing_functions import get_assigned_voice_ids
+from metrics import REGISTRY, JOBS_FINISHED, Gauge, log_event
+from archive import iter_zip_stream
+from job_store import JobStore, ACTIVE_STATUSES
+from job_queue import JobQueue
+from incremental import load_manifest
+from pipeline import run_export
+from export_index import load_index, parse_filter, select_rows
+from planner import plan_export, measured_calls_per_second
+from sharding import SHARD_BY, shard_of, shard_folder, merge_shards, merge_stats
+from janitor import Janitor, RETAIN_OUTPUT
+from ingest import detect_format, merge_exports
 from datetime import datetime
+from zipfile import ZipFile
 import jwt
 
 # Set up the Flask application and define the upload directory.
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['ELEVENLABS_API_URL'] = os.environ.get('ELEVENLABS_API_URL', 'https://api.elevenlabs.io')
+app.config['SYNTHESIS_WORKERS'] = int(os.environ.get('SYNTHESIS_WORKERS', 4))  # Concurrent requests per job
+app.config['API_KEY_CONCURRENCY'] = int(os.environ.get('API_KEY_CONCURRENCY', 4))  # Concurrent requests per API key across jobs
+app.config['SYNTHESIS_MAX_ATTEMPTS'] = int(os.environ.get('SYNTHESIS_MAX_ATTEMPTS', 5))  # Attempts per line before it is marked failed
+app.config['RETRY_BASE_DELAY'] = float(os.environ.get('RETRY_BASE_DELAY', 1.0))  # Seconds, doubled on each retry
+app.config['RETRY_MAX_DELAY'] = float(os.environ.get('RETRY_MAX_DELAY', 60.0))
+app.config['KEEP_LOOSE_FILES'] = os.environ.get('KEEP_LOOSE_FILES', '1') == '1'  # Also write each line outside the zip
+app.config['MAX_JOB_ENTRIES'] = int(os.environ.get('MAX_JOB_ENTRIES', 0)) or None  # Entries read per job; unset for whole exports
+app.config['MAX_EXPORT_BYTES'] = int(os.environ.get('MAX_EXPORT_BYTES', 512 * 1024 ** 2))  # Decompressed size of one upload's exports
+app.config['MAX_JOB_CHARACTERS'] = int(os.environ.get('MAX_JOB_CHARACTERS', 0)) or None  # Uploads needing more billable characters are rejected
+app.config['PLANNER_SECONDS_PER_CALL'] = float(os.environ.get('PLANNER_SECONDS_PER_CALL', 2.0))  # Assumed API latency until a job has been measured
+app.config['STREAM_POLL_INTERVAL'] = 0.5  # Seconds between checks for new lines while streaming a running job
+app.config['PROGRESS_INTERVAL'] = float(os.environ.get('PROGRESS_INTERVAL', 1.0))  # Seconds between progress updates from a running job
+app.config['EVENTS_HEARTBEAT'] = 15  # Seconds between keep-alive comments on an idle progress event stream
+app.config['JOB_DB_PATH'] = os.environ.get('JOB_DB_PATH', 'jobs.sqlite3')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))  # Jobs processed at once; further uploads wait in the queue
+app.config['JOB_SHARDS'] = int(os.environ.get('JOB_SHARDS', 1))  # Shard jobs each upload is split into, for any worker process to claim
+app.config['JOB_SHARD_BY'] = os.environ.get('JOB_SHARD_BY', 'conversation')  # 'conversation' or 'character'
+app.config['RESUME_INTERRUPTED_JOBS'] = os.environ.get('RESUME_INTERRUPTED_JOBS', '1') == '1'  # Off for extra worker processes
+if app.config['JOB_SHARD_BY'] not in SHARD_BY:
+    raise ValueError(f"JOB_SHARD_BY must be one of {', '.join(SHARD_BY)}.")
+app.config['AUDIO_CACHE_DIR'] = os.environ.get('AUDIO_CACHE_DIR', 'audio_cache')
+app.config['AUDIO_CACHE_MAX_BYTES'] = int(os.environ.get('AUDIO_CACHE_MAX_BYTES', 2 * 1024 ** 3))  # 2 GB
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5.0))  # Seconds to open a connection to ElevenLabs
+app.config['HTTP_READ_TIMEOUT'] = float(os.environ.get('HTTP_READ_TIMEOUT', 60.0))  # Seconds to wait for a response
+app.config['VOICE_CATALOG_TTL'] = float(os.environ.get('VOICE_CATALOG_TTL', 600))  # Seconds an API key's voice list is reused
+app.config['VALIDATE_VOICES'] = os.environ.get('VALIDATE_VOICES', '1') == '1'  # Reject uploads assigning voices the key cannot use
+app.config['AUDIO_POSTPROCESS'] = os.environ.get('AUDIO_POSTPROCESS', '0') == '1'  # Trim and normalize WAV output; needs NumPy
+app.config['AUDIO_TARGET_DBFS'] = float(os.environ.get('AUDIO_TARGET_DBFS', -20.0))  # Loudness every WAV line is brought to
+app.config['AUDIO_SILENCE_DBFS'] = float(os.environ.get('AUDIO_SILENCE_DBFS', -50.0))  # Quieter lead-in and tail audio is trimmed
+app.config['AUDIO_POSTPROCESS_WORKERS'] = int(os.environ.get('AUDIO_POSTPROCESS_WORKERS', 2))  # Processes shared by every WAV job
+if app.config['AUDIO_POSTPROCESS'] and not postprocessing_available():
+    raise ValueError("AUDIO_POSTPROCESS requires NumPy: pip install numpy")
+app.config['UPLOADS_MAX_BYTES'] = int(os.environ.get('UPLOADS_MAX_BYTES', 0)) or None  # Budget for the uploads folder; unset for none
+app.config['JOB_TTL'] = float(os.environ.get('JOB_TTL', 30 * 24 * 3600))  # Seconds finished jobs are kept; 0 keeps them forever
+app.config['SESSION_TTL'] = float(os.environ.get('SESSION_TTL', 7 * 24 * 3600))  # Seconds unused session files are kept
+app.config['RETAIN_OUTPUT'] = os.environ.get('RETAIN_OUTPUT', 'both')  # 'both', 'zip' or 'loose' audio of completed jobs
+app.config['JANITOR_INTERVAL'] = float(os.environ.get('JANITOR_INTERVAL', 600))  # Seconds between cleanups; 0 disables them
+if app.config['RETAIN_OUTPUT'] not in RETAIN_OUTPUT:
+    raise ValueError(f"RETAIN_OUTPUT must be one of {', '.join(RETAIN_OUTPUT)}.")
+# Keep-alive connections per host; enough for every job worker's requests to reuse one
+app.config['HTTP_POOL_MAXSIZE'] = int(os.environ.get(
+    'HTTP_POOL_MAXSIZE', max(16, app.config['JOB_WORKERS'] * app.config['SYNTHESIS_WORKERS'])))
 app.secret_key = os.urandom(24)  # Random secret key
 
 # Configure server-side session
@@ -23,15 +89,43 @@ app.config['SESSION_TYPE'] = 'filesystem'
 app.config['SESSION_FILE_DIR'] = './.flask_session/'
 Session(app)
 
-# Dictionary to store job information
-jobs = {}
+# Durable job records, so a restart loses nothing
+job_store = JobStore(app.config['JOB_DB_PATH'])
+
+# Synthesized audio shared by every job, so unchanged lines are never re-synthesized
+audio_cache = AudioCache(app.config['AUDIO_CACHE_DIR'], app.config['AUDIO_CACHE_MAX_BYTES'])
+
+# Keep-alive connections shared by every call to ElevenLabs, so lines and logins skip the TLS handshake
+http_client = HTTPClient(
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['HTTP_READ_TIMEOUT'],
+    pool_maxsize=app.config['HTTP_POOL_MAXSIZE']
+)
+
+# Voices available to each API key, shared by logins and uploads until they expire
+voice_catalog = VoiceCatalog(http_client, app.config['ELEVENLABS_API_URL'], ttl=app.config['VOICE_CATALOG_TTL'])
+
+# Keeps finished jobs and sessions within their TTLs and the uploads folder within its budget
+janitor = Janitor(
+    job_store, app.config['UPLOAD_FOLDER'], app.config['SESSION_FILE_DIR'],
+    max_bytes=app.config['UPLOADS_MAX_BYTES'],
+    job_ttl=app.config['JOB_TTL'] or None,
+    session_ttl=app.config['SESSION_TTL'] or None,
+    retain_output=app.config['RETAIN_OUTPUT'],
+    interval=app.config['JANITOR_INTERVAL']
+)
+
+# Process pool for WAV post-processing, started by the first job that needs it
+postprocess_pool = None
+postprocess_pool_lock = threading.Lock()
 
 # Ensure the uploads folder exists
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
-# Define a consistent secret key for JWT encoding/decoding
-JWT_SECRET_KEY = os.urandom(24)  # Random JWT secret key
+# Define a consistent secret key for JWT encoding/decoding.
+# Set JWT_SECRET_KEY in the environment so queued jobs can still be resumed after a restart.
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or os.urandom(24)  # Random JWT secret key
 
 # Define the route for the API key input
 @app.route('/')
@@ -47,20 +141,22 @@ def verify_key():
     payload = {'api_key': api_key}
     token = jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256")
 
-    # Test the API key by making a request to ElevenLabs API
-    headers = {
-        "xi-api-key": api_key
-    }
-    response = requests.get('https://api.elevenlabs.io/v1/voices', headers=headers)
-
-    if response.status_code == 200:
-        # Store JWT Token and logged_in status in the session
-        session['token'] = token
-        session['logged_in'] = True
-        return redirect(url_for('upload_page'))  # Redirect to file upload page
-    else:
+    # Test the API key by fetching its voices from ElevenLabs, which uploads then validate against.
+    # A key whose voices were fetched recently is not checked again.
+    try:
+        voice_catalog.get(api_key)
+    except requests.HTTPError:
         flash('Invalid API key. Please try again.', 'error')
         return redirect(url_for('index'))
+    except requests.RequestException as e:
+        log_event('verify_key_error', f"Error verifying API key: {e}", error=str(e))
+        flash('Could not reach ElevenLabs. Please try again.', 'error')
+        return redirect(url_for('index'))
+
+    # Store JWT Token and logged_in status in the session
+    session['token'] = token
+    session['logged_in'] = True
+    return redirect(url_for('upload_page'))  # Redirect to file upload page
 
 # Route for logging out
 @app.route('/logout')
@@ -78,125 +174,368 @@ def upload_page():
         return redirect(url_for('index'))  # Redirect to the API key page if not logged in
     return render_template('upload_files.html')  # Render the file upload page
 
-def process_audio_files(dialogue_file_path, voices_file_path, token, output_format, job_id):
+def build_engine(api_key, output_format):
     """
-    This function processes the audio files in a separate thread.
+    Creates a synthesis engine for an API key with the app's settings, audio cache and connection pool.
+    """
+    return SynthesisEngine(
+        api_key,
+        output_format=output_format,
+        api_url=app.config['ELEVENLABS_API_URL'],
+        max_workers=app.config['SYNTHESIS_WORKERS'],
+        key_concurrency=app.config['API_KEY_CONCURRENCY'],
+        cache=audio_cache,
+        http_client=http_client,
+        retry_policy=RetryPolicy(
+            max_attempts=app.config['SYNTHESIS_MAX_ATTEMPTS'],
+            base_delay=app.config['RETRY_BASE_DELAY'],
+            max_delay=app.config['RETRY_MAX_DELAY']
+        )
+    )
+
+def save_dialogue_files(dialogue_files, folder):
+    """
+    Saves an upload's dialogue exports into folder as the single export its job reads. A lone CSV is saved
+    as it is. Gzip- and zip-compressed exports, and several exports at once, are decompressed and merged
+    straight from the upload as they are read, without saving the uploaded files first.
+    Returns:
+        tuple: The export's path, and merge_exports' counts when exports were merged (otherwise None).
+    Raises:
+        ValueError: If the exports cannot be read or merged.
+    """
+    if len(dialogue_files) == 1 and detect_format(dialogue_files[0].stream) == 'csv':
+        dialogue_file_path = os.path.join(folder, secure_filename(dialogue_files[0].filename) or 'dialogue.csv')
+        dialogue_files[0].save(dialogue_file_path)
+        return dialogue_file_path, None
+    dialogue_file_path = os.path.join(folder, 'dialogue.csv')
+    merged = merge_exports([(dialogue_file.filename, dialogue_file.stream) for dialogue_file in dialogue_files],
+                           dialogue_file_path, max_bytes=app.config['MAX_EXPORT_BYTES'])
+    return dialogue_file_path, merged
+
+def describe_merge(merged):
+    description = (f"Merged {merged['exports']} export(s) into one job: {merged['rows']:,} dialogue entries, "
+                   f"{merged['duplicates']:,} repeated entry tag(s) skipped.")
+    if merged['conflicts']:
+        description += f" {merged['conflicts']:,} of them had different text; the first export's line was kept."
+    return description
+
+def read_session_token():
+    """
+    Returns the session's JWT token and the API key it holds, or (None, None) if there is no token or it no longer
+    verifies, e.g. after a restart that generated a new JWT_SECRET_KEY.
     """
-    entries = parse_dialogue_csv(dialogue_file_path, voices_file_path)
+    token = session.get('token')
+    if not token:
+        return None, None
+    try:
+        return token, jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"]).get('api_key')
+    except jwt.InvalidTokenError:
+        return None, None
+
+def find_unknown_voices(voices_file_path, api_key):
+    """
+    Checks every voice in the assignments against the voices the user's API key can use, in one pass.
+    Returns:
+        list: {'voice_id', 'characters'} for each voice the key cannot use. Empty when validation is off
+            or the voice list cannot be fetched, in which case the job reports failing lines as before.
+    """
+    if not app.config['VALIDATE_VOICES']:
+        return []
+    assigned = get_assigned_voice_ids(voices_file_path)
+    try:
+        unknown = voice_catalog.find_unknown(api_key, assigned)
+    except requests.RequestException as e:
+        log_event('voice_catalog_error', f"Could not fetch voices to validate the assignments: {e}", error=str(e))
+        return []
+    return [{'voice_id': voice_id, 'characters': assigned[voice_id]} for voice_id in unknown]
+
+def describe_voices(voices):
+    return ', '.join(f"{voice['voice_id']} ({', '.join(voice['characters'])})" for voice in voices)
 
+def plan_job(dialogue_file_path, voices_file_path, output_format, api_key, base_job_id=None, selection=None):
+    """
+    Runs the preflight planner over an export with the settings its job would use.
+    The wall-time estimate uses the throughput of recent jobs, or PLANNER_SECONDS_PER_CALL
+    per concurrent request until a job has been measured.
+    """
+    previous_manifest = None
+    if base_job_id:
+        previous_manifest = load_manifest(os.path.join(app.config['UPLOAD_FOLDER'], base_job_id)) or []
+
+    calls_per_second = measured_calls_per_second(job_store.recent_throughputs())
+    throughput_source = 'measured'
+    if calls_per_second is None:
+        concurrency = min(app.config['SYNTHESIS_WORKERS'], app.config['API_KEY_CONCURRENCY'])
+        calls_per_second = concurrency / app.config['PLANNER_SECONDS_PER_CALL']
+        throughput_source = 'assumed'
+
+    plan = plan_export(build_engine(api_key, output_format), dialogue_file_path, voices_file_path,
+                       previous_manifest=previous_manifest, limit=app.config['MAX_JOB_ENTRIES'],
+                       selection=parse_filter(selection) if selection else None, calls_per_second=calls_per_second)
+    plan['throughput_source'] = throughput_source
+    plan['unknown_voices'] = find_unknown_voices(voices_file_path, api_key)
+    plan['queued_jobs'] = job_store.count_jobs('queued')
+    plan['max_job_characters'] = app.config['MAX_JOB_CHARACTERS']
+    plan['too_large'] = bool(app.config['MAX_JOB_CHARACTERS']) and \
+        plan['billable_characters'] > app.config['MAX_JOB_CHARACTERS']
+    return plan
+
+def build_postprocessor():
+    """
+    Creates a job's post-processor on the shared process pool, starting the pool on first use.
+    """
+    global postprocess_pool
+    with postprocess_pool_lock:
+        if postprocess_pool is None:
+            postprocess_pool = create_pool(app.config['AUDIO_POSTPROCESS_WORKERS'])
+    return AudioPostProcessor(postprocess_pool, settings={
+        'target_dbfs': app.config['AUDIO_TARGET_DBFS'],
+        'silence_dbfs': app.config['AUDIO_SILENCE_DBFS'],
+    })
+
+def process_audio_files(dialogue_file_path, voices_file_path, token, output_format, job_id, base_job_id=None,
+                        shard=None, selection=None):
+    """
+    This function processes the audio files in a separate thread.
+    When base_job_id is given, only lines added or changed since that job are synthesized.
+    When selection (a filter expression) is given, only the lines it selects are read and synthesized.
+    When shard is given (the shard job's record), only that shard's lines are synthesized, into a folder
+    of the sharded job; its finished lines are recorded under the sharded job so they stream from there.
+    """
     # Decode the JWT token to get the API key
     try:
         decoded_payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
     except jwt.InvalidTokenError:
         # If the token is invalid or expired, we can't process further.
         # Mark the job as failed
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['error'] = 'Invalid token'
+        job_store.update_job(job_id, status='failed', error='Invalid token')
         return
 
     # Get API key from decoded JWT token
     api_key = decoded_payload.get('api_key')
 
-    # Date-time stamp for filenames
-    date_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    # Base output directory
-    output_base_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id, f"voice_files_{date_stamp}")
-    os.makedirs(output_base_dir, exist_ok=True)
-
-    # Character-specific folders
-    player_folders = {}
-    npc_folder = output_base_dir
-
-    # Get unique player voices from entries
-    player_voices = {entry.voiceID for entry in entries if entry.characterName == "Player" and entry.voiceID is not None}
-    for index, voice_id in enumerate(sorted(player_voices), start=1):
-        folder_name = f"Player{index}"
-        folder_path = os.path.join(output_base_dir, folder_name)
-        player_folders[voice_id] = folder_path
-        os.makedirs(folder_path, exist_ok=True)
-
-    # Generate audio files using ElevenLabs API
-    for entry in entries[:31]:
-        text = entry.getCleanText()
-        if not text:
-            continue  # Skip entries with no text
-
-        voice_id = entry.getVoiceID()
-        if not voice_id:
-            continue  # Skip entries with no voice ID
-
-        # Determine folder based on character type
-        if entry.characterName == "Player" and voice_id in player_folders:
-            folder_path = player_folders[voice_id]
-        else:
-            folder_path = npc_folder  # Save NPC lines or player lines without a voice folder directly in main folder
-
-        # Set the Accept header based on the selected output format
-        accept_header = 'audio/mpeg'  # Default to 'mp3'
-        if output_format == 'ogg':
-            accept_header = 'audio/ogg'
-
-        # Generate audio request
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-        headers = {
-            "xi-api-key": api_key,
-            "Accept": accept_header,
-            "Content-Type": "application/json"
-        }
-        data = {
-            "text": text,
-            "model_id": "eleven_multilingual_v2",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5,
-                "style": 0.5
-            }
-        }
+    audio_job_id = shard['parent_job_id'] if shard else job_id
+    job_folder = os.path.join(app.config['UPLOAD_FOLDER'], audio_job_id)
+    if shard:
+        job_folder = shard_folder(job_folder, shard['shard_index'])
+
+    # Date-time stamp for filenames, kept from the first run when an interrupted job resumes
+    # and shared by every shard of a sharded job
+    date_stamp = job_store.get_job(audio_job_id)['date_stamp']
+    if not date_stamp:
+        date_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        job_store.update_job(job_id, date_stamp=date_stamp)
+
+    def record_audio(entry, arcname, file_path):
+        # Finished lines can be downloaded individually or streamed while the job runs
+        job_store.add_audio(audio_job_id, entry.getTag(), arcname, os.path.abspath(file_path))
+
+    def record_total(total):
+        job_store.update_job(job_id, total_entries=total)
+
+    def record_progress(progress):
+        # Live counts for the status API and the progress event stream
+        failed_entries = progress.pop('failed_entries')
+        job_store.update_job(job_id, progress=progress, failed_entries=failed_entries)
+
+    # Generate audio files using ElevenLabs API through a bounded worker pool
+    engine = build_engine(api_key, output_format)
+
+    previous_manifest = None
+    if base_job_id:
+        previous_manifest = load_manifest(os.path.join(app.config['UPLOAD_FOLDER'], base_job_id)) or []
+
+    completed_audio = job_store.get_audio(audio_job_id)
+    shard_spec = None
+    if shard:
+        shard_spec = (shard['shard_by'], shard['shard_index'], shard['shard_count'])
+        completed_audio = [item for item in completed_audio
+                           if shard_of(item['entrytag'], shard['shard_by'], shard['shard_count']) == shard['shard_index']]
+
+    result = run_export(
+        engine, dialogue_file_path, voices_file_path,
+        job_folder=job_folder,
+        date_stamp=date_stamp,
+        job_id=job_id,
+        keep_loose_files=app.config['KEEP_LOOSE_FILES'],
+        previous_manifest=previous_manifest,
+        base_job_id=base_job_id,
+        completed_audio=[(item['arcname'], item['path']) for item in completed_audio],
+        limit=app.config['MAX_JOB_ENTRIES'],
+        selection=parse_filter(selection) if selection else None,
+        shard=shard_spec,
+        postprocessor=build_postprocessor() if output_format == 'wav' and app.config['AUDIO_POSTPROCESS'] else None,
+        on_line=record_audio,
+        on_total=record_total,
+        on_progress=record_progress,
+        progress_interval=app.config['PROGRESS_INTERVAL']
+    )
+    stats = result['stats']
+    zip_file_path = result['zip_file_path']
+
+    # Processing completed, mark job as completed and store the zip file path
+    job_store.update_job(
+        job_id,
+        status='completed',
+        filename=zip_file_path,
+        failed_entries=result['failed_entries'],
+        delta=result['delta'],
+        throughput=stats,
+        cache_hits=stats['cache_hits'],
+        cache_misses=stats['cache_misses']
+    )
+    log_event('job_completed', f"Processing complete for job_id {job_id}. Output available at: {zip_file_path}",
+              job_id=job_id, filename=zip_file_path, failed=len(result['failed_entries']))
+
+def merge_sharded_job(job):
+    """
+    Combines the output of a sharded job's completed shards into the job's own zip archive,
+    loose files and manifest, and marks it completed.
+    """
+    job_id = job['job_id']
+    date_stamp = job['date_stamp']
+    job_folder = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+    shards = job_store.get_shards(job_id)
+    merged = merge_shards(job_folder, date_stamp, job['shard_count'], keep_loose_files=app.config['KEEP_LOOSE_FILES'])
+
+    # Loose files were moved out of the shard folders, so point their recorded lines at the new location
+    output_base_dir = os.path.abspath(os.path.join(job_folder, f"voice_files_{date_stamp}"))
+    for shard in shards:
+        shard_output_dir = os.path.abspath(os.path.join(shard_folder(job_folder, shard['shard_index']),
+                                                        f"voice_files_{date_stamp}"))
+        job_store.relocate_audio(job_id, shard_output_dir + os.sep, output_base_dir + os.sep)
+
+    # Shards run side by side, so the job took about as long as its slowest shard
+    shard_stats = [shard['throughput'] or {} for shard in shards]
+    stats = merge_stats(shard_stats, max(item.get('elapsed_seconds', 0.0) for item in shard_stats))
+    failed_entries = [failed for shard in shards for failed in shard['failed_entries'] or []]
+    job_store.update_job(
+        job_id,
+        status='completed',
+        filename=merged['zip_file_path'],
+        total_entries=sum(shard['total_entries'] or 0 for shard in shards),
+        failed_entries=failed_entries,
+        delta=merged['delta'],
+        throughput=stats,
+        cache_hits=stats['cache_hits'],
+        cache_misses=stats['cache_misses']
+    )
+    log_event('job_completed', f"Merged {len(shards)} shards of job_id {job_id}. Output available at: {merged['zip_file_path']}",
+              job_id=job_id, filename=merged['zip_file_path'], failed=len(failed_entries), shards=len(shards))
+
+def fail_sharded_job(job_id, error):
+    """
+    Marks a sharded job failed after one of its shards failed; its remaining shards are skipped.
+    """
+    if job_store.get_job(job_id)['status'] == 'sharded':
+        job_store.update_job(job_id, status='failed', error=error)
+        JOBS_FINISHED.inc(status='failed')
 
-        response = requests.post(url, json=data, headers=headers)
+def run_job(job):
+    """
+    Processes a job claimed from the queue by a worker: a whole job, one shard of a sharded job,
+    or the merge of a sharded job whose shards have all completed.
+    """
+    if job['status'] == 'merging':
+        try:
+            merge_sharded_job(job)
+        except Exception:
+            JOBS_FINISHED.inc(status='failed')  # The queue records the error on the job
+            raise
+        JOBS_FINISHED.inc(status='completed')
+        return
+
+    parent_job_id = job.get('parent_job_id')
+    if parent_job_id and job_store.get_job(parent_job_id)['status'] == 'failed':
+        job_store.update_job(job['job_id'], status='failed', error='Another shard of this job failed.')
+        return
 
-        if response.status_code == 200:
-            audio_filename = f"{entry.getTag()}_{date_stamp}.{output_format}"
-            audio_file_path = os.path.join(folder_path, audio_filename)
-            with open(audio_file_path, 'wb') as f:
-                f.write(response.content)
+    try:
+        process_audio_files(job['dialogue_file_path'], job['voices_file_path'], job['token'],
+                            job['output_format'], job['job_id'], base_job_id=job['base_job_id'],
+                            shard=job if parent_job_id else None, selection=job['selection'])
+    except Exception as e:
+        if parent_job_id:
+            fail_sharded_job(parent_job_id, f"Shard {job['shard_index'] + 1} of {job['shard_count']} failed: {e}")
         else:
-            # Log the error and continue
-            print(f"Error generating audio for entry {entry.getTag()}: {response.status_code}, {response.text}")
-
-    # Create a zip file of the audio files for download
-    zip_filename = f'voice_files_{date_stamp}.zip'
-    zip_file_path = os.path.join(app.config['UPLOAD_FOLDER'], job_id, zip_filename)
-    with ZipFile(zip_file_path, 'w') as zipf:
-        for root, dirs, files in os.walk(output_base_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, output_base_dir)
-                zipf.write(file_path, arcname)
+            JOBS_FINISHED.inc(status='failed')  # The queue records the error on the job
+        raise
+    job_info = job_store.get_job(job['job_id'])
+    if not parent_job_id:
+        JOBS_FINISHED.inc(status=job_info['status'])
+    elif job_info['status'] == 'failed':
+        fail_sharded_job(parent_job_id, f"Shard {job['shard_index'] + 1} of {job['shard_count']} failed: {job_info['error']}")
+    else:
+        # The worker that finishes the last shard claims the merge next
+        job_queue.notify()
 
-    # Processing completed, mark job as completed and store the zip file path
-    jobs[job_id]['status'] = 'completed'
-    jobs[job_id]['filename'] = zip_file_path
-    print(f"Processing complete for job_id {job_id}. Output available at: {zip_file_path}")
+def get_owner(token):
+    """
+    Identifies the user behind a session token by a hash of their API key, used for fair scheduling.
+    """
+    try:
+        api_key = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"]).get('api_key') or ''
+    except jwt.InvalidTokenError:
+        api_key = ''
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+# Bounded pool of workers shared by every upload
+job_queue = JobQueue(job_store, run_job, num_workers=app.config['JOB_WORKERS'],
+                     resume_interrupted=app.config['RESUME_INTERRUPTED_JOBS'])
+
+# Read when /metrics is scraped
+REGISTRY.register(Gauge('tts_jobs_queued', "Jobs waiting for a worker.", lambda: job_store.count_jobs('queued')))
+REGISTRY.register(Gauge('tts_job_workers_active', "Job workers currently processing a job.",
+                        lambda: job_queue.active_workers))
+REGISTRY.register(Gauge('tts_audio_cache_bytes', "Bytes held by the audio cache.", lambda: audio_cache.total_bytes))
+REGISTRY.register(Gauge('tts_uploads_bytes', "Bytes held by job folders at the last cleanup.",
+                        lambda: janitor.usage.get('uploads_bytes', 0)))
+REGISTRY.register(Gauge('tts_sessions_bytes', "Bytes held by session files at the last cleanup.",
+                        lambda: janitor.usage.get('sessions_bytes', 0)))
+
+@app.before_request
+def start_job_queue():
+    # Started on the first request so the debug reloader's parent process never runs jobs.
+    # Extra worker.py processes share the folders but leave cleaning them to the web app.
+    job_queue.start()
+    if app.config['JANITOR_INTERVAL'] > 0:
+        janitor.start()
 
 # Route for handling the file uploads and processing
 @app.route('/upload', methods=['POST'])
 def upload_files():
+    job_folder = None
     try:
-        # Confirm that both files have been submitted
-        dialogue_file = request.files.get('dialogue')
+        # Retrieve the JWT token from the session instead of API key. A token signed with a key from before a
+        # restart no longer verifies, so the user logs in again before anything is saved.
+        token, api_key = read_session_token()
+        if not token:
+            session.clear()
+            flash('Your session has expired. Please re-enter your API key.', 'error')
+            return redirect(url_for('index'))
+
+        # Confirm that both files have been submitted. Several dialogue exports, or compressed ones, make one job.
+        dialogue_files = [dialogue_file for dialogue_file in request.files.getlist('dialogue') if dialogue_file.filename]
         voice_file = request.files.get('voices')
         output_format = request.form.get('output_format', 'ogg')  # Default to 'ogg' if not provided
+        base_job_id = request.form.get('base_job_id', '').strip() or None  # Optional previous job for incremental mode
+        selection = request.form.get('filter', '').strip() or None  # Optional subset of the export, e.g. 'conversation:30-45'
 
-        if not dialogue_file or not voice_file:
+        if not dialogue_files or not voice_file:
             flash('Both dialogue and voice files are required.', 'error')
             return redirect(request.url)
 
-        if dialogue_file.filename == '' or voice_file.filename == '':
+        if voice_file.filename == '':
             flash('No file(s) selected.', 'error')
             return redirect(request.url)
 
+        if base_job_id:
+            base_job = job_store.get_job(base_job_id)
+            if base_job is None or base_job['status'] != 'completed' or \
+                    load_manifest(os.path.join(app.config['UPLOAD_FOLDER'], base_job_id)) is None:
+                flash('The previous Job ID must belong to a completed job.', 'error')
+                return redirect(url_for('upload_page'))
+
         # Generate a unique job_id
         job_id = str(uuid.uuid4())
 
@@ -204,41 +543,106 @@ def upload_files():
         job_folder = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
         os.makedirs(job_folder, exist_ok=True)
 
-        dialogue_filename = secure_filename(dialogue_file.filename)
-        voices_filename = secure_filename(voice_file.filename)
-
-        dialogue_file_path = os.path.join(job_folder, dialogue_filename)
-        voices_file_path = os.path.join(job_folder, voices_filename)
-
-        dialogue_file.save(dialogue_file_path)
+        voices_file_path = os.path.join(job_folder, secure_filename(voice_file.filename))
         voice_file.save(voices_file_path)
+        try:
+            dialogue_file_path, merged = save_dialogue_files(dialogue_files, job_folder)
+        except ValueError as e:
+            shutil.rmtree(job_folder, ignore_errors=True)
+            flash(str(e), 'error')
+            return redirect(url_for('upload_page'))
+
+        # Check the filter against the export's index, which is saved next to the upload for the job to reuse
+        if selection:
+            try:
+                selected = select_rows(load_index(dialogue_file_path), parse_filter(selection))
+            except ValueError as e:
+                shutil.rmtree(job_folder, ignore_errors=True)
+                flash(str(e), 'error')
+                return redirect(url_for('upload_page'))
+            if not selected:
+                shutil.rmtree(job_folder, ignore_errors=True)
+                flash('The filter does not select any line of the export.', 'error')
+                return redirect(url_for('upload_page'))
+
+        # Reject assignments naming voices the API key cannot use, rather than failing every line of them
+        unknown_voices = find_unknown_voices(voices_file_path, api_key)
+        if unknown_voices:
+            shutil.rmtree(job_folder, ignore_errors=True)
+            flash(f"These voice IDs in the voice assignments are not available to your API key: "
+                  f"{describe_voices(unknown_voices)}.", 'error')
+            return redirect(url_for('upload_page'))
+
+        # Reject jobs over the character budget before any request is made
+        if app.config['MAX_JOB_CHARACTERS']:
+            plan = plan_job(dialogue_file_path, voices_file_path, output_format, api_key, base_job_id=base_job_id,
+                            selection=selection)
+            if plan['too_large']:
+                shutil.rmtree(job_folder, ignore_errors=True)
+                flash(f"This job needs {plan['billable_characters']:,} characters of synthesis, over the limit of "
+                      f"{app.config['MAX_JOB_CHARACTERS']:,}. Split the export or use a previous Job ID.", 'error')
+                return redirect(url_for('upload_page'))
+
+        # Queue the job; a worker picks it up when one is free. Large exports can be split into shards
+        # that workers in this and other processes synthesize side by side.
+        if app.config['JOB_SHARDS'] > 1:
+            job_store.create_sharded_job(job_id, get_owner(token), dialogue_file_path, voices_file_path, token,
+                                         output_format, datetime.now().strftime("%Y%m%d_%H%M%S"),
+                                         app.config['JOB_SHARDS'], app.config['JOB_SHARD_BY'],
+                                         base_job_id=base_job_id, selection=selection)
+            for _ in range(app.config['JOB_SHARDS']):
+                job_queue.notify()
+        else:
+            job_store.create_job(job_id, get_owner(token), dialogue_file_path, voices_file_path, token, output_format,
+                                 base_job_id=base_job_id, selection=selection)
+            job_queue.notify()
 
-        # Retrieve the JWT token from the session instead of API key
-        token = session.get('token')
-        if not token:
-            flash('API key not found in session. Please re-enter your API key.', 'error')
-            return redirect(url_for('index'))
-
-        # Store job information
-        jobs[job_id] = {
-            'status': 'processing',
-            'filename': None
-        }
-
-        # Start a new thread for processing audio files
-        thread = threading.Thread(
-            target=process_audio_files,
-            args=(dialogue_file_path, voices_file_path, token, output_format, job_id)
-        )
-        thread.start()
-
+        if merged:
+            flash(describe_merge(merged), 'info')
         flash(f"Your files are being processed in the background. Your job ID is {job_id}. Use this ID to check the status.", 'info')
         return redirect(url_for('job_status_page', job_id=job_id))
 
     except Exception as e:
+        if job_folder and job_store.get_job(job_id) is None:
+            shutil.rmtree(job_folder, ignore_errors=True)
         flash(f'An error occurred: {e}', 'error')
         return redirect(request.url)
 
+@app.route('/api/plan', methods=['POST'])
+def plan_upload():
+    """
+    This route estimates a job from the upload form's files without queuing it: characters per voice,
+    API calls after repeated and cached lines are reused, and the expected wall time.
+    """
+    token, api_key = read_session_token()
+    if not token:
+        session.clear()
+        return jsonify({'error': 'Your session has expired. Please re-enter your API key.'}), 401
+
+    dialogue_files = [dialogue_file for dialogue_file in request.files.getlist('dialogue') if dialogue_file.filename]
+    voice_file = request.files.get('voices')
+    output_format = request.form.get('output_format', 'ogg')
+    base_job_id = request.form.get('base_job_id', '').strip() or None
+    selection = request.form.get('filter', '').strip() or None
+    if not dialogue_files or not voice_file or voice_file.filename == '':
+        return jsonify({'error': 'Both dialogue and voice files are required.'}), 400
+    if base_job_id and load_manifest(os.path.join(app.config['UPLOAD_FOLDER'], base_job_id)) is None:
+        return jsonify({'error': 'The previous Job ID must belong to a completed job.'}), 400
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        voices_file_path = os.path.join(tmp_dir, secure_filename(voice_file.filename) or 'voices.json')
+        voice_file.save(voices_file_path)
+        try:
+            dialogue_file_path, merged = save_dialogue_files(dialogue_files, tmp_dir)
+            plan = plan_job(dialogue_file_path, voices_file_path, output_format, api_key, base_job_id=base_job_id,
+                            selection=selection)
+            plan['merged'] = merged
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': f"Could not read the files: {e}"}), 400
+    return jsonify(plan)
+
 @app.route('/job_status_check', methods=['POST'])
 def job_status_check():
     """
@@ -253,7 +657,7 @@ def job_status_page(job_id):
     """
     This route displays the status of a job based on the provided job_id.
     """
-    job_info = jobs.get(job_id)
+    job_info = job_store.get_job(job_id)
 
     if job_info is None:
         flash('Invalid Job ID.', 'error')
@@ -262,22 +666,132 @@ def job_status_page(job_id):
     if job_info['status'] == 'completed':
         # Job is completed, user can download the file
         download_url = url_for('download_file', job_id=job_id)
-        return render_template('job_status.html', zip_available=True, job_id=job_id, download_url=download_url)
-    elif job_info['status'] == 'processing':
-        # Job is still processing
-        return render_template('job_status.html', zip_available=False, job_id=job_id)
+        return render_template('job_status.html', zip_available=True, job_id=job_id, download_url=download_url,
+                               failed_entries=job_info.get('failed_entries') or [], delta=job_info.get('delta'),
+                               calls_saved=(job_info.get('throughput') or {}).get('deduplicated', 0))
+    elif job_info['status'] in ACTIVE_STATUSES:
+        # Job is queued or still processing
+        return render_template('job_status.html', zip_available=False, job_id=job_id,
+                               queued=job_info['status'] == 'queued',
+                               stream_url=url_for('stream_download', job_id=job_id),
+                               events_url=url_for('job_events', job_id=job_id),
+                               lines_ready=job_info['lines_ready'], total_entries=job_info['total_entries'])
+    elif job_info['status'] == 'expired':
+        flash(f"Job {job_id} has expired and its files were removed.", 'error')
+        return redirect(url_for('upload_page'))
     else:
         # Job failed or unknown status
-        error_message = job_info.get('error', 'Unknown error')
+        error_message = job_info.get('error') or 'Unknown error'
         flash(f"Job {job_id} failed or has an unknown status: {error_message}", 'error')
         return redirect(url_for('upload_page'))
 
+def job_status_payload(job_info):
+    """
+    Describes a job's status and progress for the JSON status API and the progress event stream.
+    The ETA is given once the whole export has been read and the job's throughput is known.
+    While a sharded job's shards run, its progress is the sum of theirs.
+    """
+    job_id = job_info['job_id']
+    progress = job_info.get('progress') or {}
+    failed_entries = job_info.get('failed_entries') or []
+    total_entries = job_info.get('total_entries')
+    if job_info['status'] == 'sharded':
+        shards = job_store.get_shards(job_id)
+        shard_progress = [shard['progress'] for shard in shards if shard.get('progress')]
+        if shard_progress:
+            progress = merge_stats(shard_progress, max(item['elapsed_seconds'] for item in shard_progress))
+        failed_entries = [failed for shard in shards for failed in shard.get('failed_entries') or []]
+        shard_totals = [shard['total_entries'] for shard in shards]
+        total_entries = sum(shard_totals) if None not in shard_totals else None
+    lines_per_second = progress.get('lines_per_second') or 0.0
+    eta_seconds = None
+    if job_info['status'] in ('processing', 'sharded') and total_entries and lines_per_second > 0:
+        remaining = max(0, total_entries - job_info['lines_ready'] - len(failed_entries))
+        eta_seconds = round(remaining / lines_per_second, 1)
+    return {
+        'job_id': job_id,
+        'status': job_info['status'],
+        'error': job_info.get('error'),
+        'created_at': job_info['created_at'],
+        'updated_at': job_info['updated_at'],
+        'lines_ready': job_info['lines_ready'],
+        'total_entries': total_entries,
+        'lines_per_second': lines_per_second,
+        'eta_seconds': eta_seconds,
+        'progress': progress,
+        'failed_entries': failed_entries,
+        'delta': job_info.get('delta'),
+        'selection': job_info.get('selection'),
+        'stream_url': url_for('stream_download', job_id=job_id),
+        'download_url': url_for('download_file', job_id=job_id) if job_info['status'] == 'completed' else None,
+    }
+
+@app.route('/metrics')
+def metrics():
+    """
+    This route exposes pipeline metrics in the Prometheus text format.
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/storage')
+def storage_usage():
+    """
+    This route reports the disk used by job folders and sessions, as measured by the last cleanup, and by the audio cache.
+    """
+    return jsonify(dict(janitor.usage, audio_cache_bytes=audio_cache.total_bytes,
+                        audio_cache_max_bytes=app.config['AUDIO_CACHE_MAX_BYTES']))
+
+@app.route('/api/jobs/<job_id>')
+def job_status_api(job_id):
+    """
+    This route returns a job's status and progress as JSON, for scripts.
+    """
+    job_info = job_store.get_job(job_id)
+    if job_info is None:
+        return jsonify({'error': 'Invalid Job ID.'}), 404
+    return jsonify(job_status_payload(job_info))
+
+@app.route('/job_status/<job_id>/events')
+def job_events(job_id):
+    """
+    This route streams a job's progress as Server-Sent Events: a 'progress' event whenever
+    the job changes, and a final 'done' event once it stops processing.
+    """
+    if job_store.get_job(job_id) is None:
+        return jsonify({'error': 'Invalid Job ID.'}), 404
+
+    def events():
+        last_state = None
+        last_sent = time.monotonic()
+        while True:
+            job_info = job_store.get_job(job_id)
+            if job_info is None:
+                return
+            if job_info['status'] not in ACTIVE_STATUSES:
+                yield f"event: done\ndata: {json.dumps(job_status_payload(job_info))}\n\n"
+                return
+            state = (job_info['updated_at'], job_info['lines_ready'])
+            if state != last_state:
+                last_state = state
+                last_sent = time.monotonic()
+                yield f"event: progress\ndata: {json.dumps(job_status_payload(job_info))}\n\n"
+            elif time.monotonic() - last_sent >= app.config['EVENTS_HEARTBEAT']:
+                # Keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(app.config['STREAM_POLL_INTERVAL'])
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering events
+    return response
+
 @app.route('/download/<job_id>')
 def download_file(job_id):
     """
     This route handles downloading the processed zip file if available.
     """
-    job_info = jobs.get(job_id)
+    job_info = job_store.get_job(job_id)
     if not job_info or not job_info.get('filename'):
         flash('File not found or job not complete.', 'error')
         return redirect(url_for('job_status_page', job_id=job_id))
@@ -285,9 +799,93 @@ def download_file(job_id):
     zip_file_path = job_info['filename']
     if zip_file_path and os.path.exists(zip_file_path):
         return send_file(zip_file_path, as_attachment=True)
+    elif job_info['status'] == 'completed' and job_info['lines_ready']:
+        # Jobs trimmed to their loose files have the zip rebuilt as it is downloaded
+        response = Response(stream_with_context(iter_zip_stream(follow_job_audio(job_id))), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename={os.path.basename(zip_file_path)}'
+        return response
     else:
         flash('File not found or job not complete.', 'error')
         return redirect(url_for('job_status_page', job_id=job_id))
 
+def follow_job_audio(job_id):
+    """
+    Yields (file_path, arcname) for each finished line of a job, waiting for
+    new lines until the job stops processing.
+    """
+    last_seq = 0
+    while True:
+        job_info = job_store.get_job(job_id)
+        if job_info is None:
+            return
+        status = job_info['status']
+        for item in job_store.get_audio(job_id, after_seq=last_seq):
+            last_seq = item['seq']
+            if os.path.exists(item['path']):
+                yield item['path'], item['arcname']
+        if status not in ACTIVE_STATUSES:
+            return
+        time.sleep(app.config['STREAM_POLL_INTERVAL'])
+
+@app.route('/download/<job_id>/stream')
+def stream_download(job_id):
+    """
+    This route streams a zip of the job's finished lines with chunked transfer,
+    following the job until it completes, so clients can start importing before synthesis ends.
+    """
+    job_info = job_store.get_job(job_id)
+    if job_info is None:
+        flash('Invalid Job ID.', 'error')
+        return redirect(url_for('upload_page'))
+
+    # A finished job's zip is already complete, and outlives its loose files when the janitor keeps only the zip
+    zip_file_path = job_info.get('filename')
+    if job_info['status'] == 'completed' and zip_file_path and os.path.exists(zip_file_path):
+        return send_file(zip_file_path, as_attachment=True, download_name=f'voice_files_{job_id}.zip')
+
+    response = Response(stream_with_context(iter_zip_stream(follow_job_audio(job_id))), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=voice_files_{job_id}.zip'
+    return response
+
+@app.route('/download/<job_id>/entries')
+def list_entries(job_id):
+    """
+    This route returns the lines finished so far as JSON, with a download URL for each.
+    """
+    job_info = job_store.get_job(job_id)
+    if job_info is None:
+        return jsonify({'error': 'Invalid Job ID.'}), 404
+
+    entries = [
+        {
+            'entrytag': item['entrytag'],
+            'arcname': item['arcname'],
+            'url': url_for('download_entry', job_id=job_id, arcname=item['arcname'])
+        }
+        for item in job_store.get_audio(job_id)
+    ]
+    return jsonify({'job_id': job_id, 'status': job_info['status'], 'entries': entries})
+
+@app.route('/download/<job_id>/entries/<path:arcname>')
+def download_entry(job_id, arcname):
+    """
+    This route downloads a single finished line by its path inside the zip, e.g. Player1/<entrytag>_<date>.ogg.
+    """
+    job_info = job_store.get_job(job_id)
+    if job_info is None:
+        return jsonify({'error': 'Invalid Job ID.'}), 404
+
+    item = job_store.find_audio(job_id, arcname)
+    if item is not None and os.path.exists(item['path']):
+        return send_file(item['path'], as_attachment=True, download_name=os.path.basename(arcname))
+    zip_file_path = job_info.get('filename')
+    if item is not None and zip_file_path and os.path.exists(zip_file_path):
+        # The loose file was removed by the janitor, but the line is still in the job's zip
+        with ZipFile(zip_file_path) as archive:
+            if arcname in archive.namelist():
+                return send_file(io.BytesIO(archive.read(arcname)), as_attachment=True,
+                                 download_name=os.path.basename(arcname))
+    return jsonify({'error': 'Line not found or not synthesized yet.'}), 404
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,80 @@
+# archive.py
+
+import threading
+from zipfile import ZipFile, ZIP_STORED
+
+class StreamingZipWriter:
+    """
+    Appends audio to a zip archive as each synthesis result arrives.
+    Entries are stored without recompression since mp3 and ogg are already compressed.
+    """
+
+    def __init__(self, zip_file_path):
+        self.zip_file_path = zip_file_path
+        self.names = []
+        self._zipf = ZipFile(zip_file_path, 'w', compression=ZIP_STORED)
+        self._lock = threading.Lock()
+
+    def add_bytes(self, arcname, data):
+        """
+        Writes an in-memory audio payload to the archive.
+        """
+        with self._lock:
+            self._zipf.writestr(arcname, data)
+            self.names.append(arcname)
+
+    def add_file(self, file_path, arcname):
+        """
+        Copies a file on disk, such as a cached line, into the archive.
+        """
+        with self._lock:
+            self._zipf.write(file_path, arcname)
+            self.names.append(arcname)
+
+    def close(self):
+        with self._lock:
+            self._zipf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+class _ChunkBuffer:
+    """
+    Write-only, unseekable sink that collects zip output until it is drained.
+    ZipFile falls back to data descriptors when it cannot seek, so each
+    entry can be sent to the client as soon as it is written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_zip_stream(files):
+    """
+    Builds a zip archive on the fly.
+    Args:
+        files (iterable): (file_path, arcname) pairs; may block while waiting for new files.
+    Yields:
+        bytes: Chunks of the archive, one per file plus the central directory at the end.
+    """
+    buffer = _ChunkBuffer()
+    with ZipFile(buffer, 'w', compression=ZIP_STORED) as zipf:
+        for file_path, arcname in files:
+            zipf.write(file_path, arcname)
+            yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,129 @@
+# audio_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+def make_cache_key(clean_text, voice_id, model_id, voice_settings, output_format):
+    """
+    Builds the content address for a synthesized line.
+    Args:
+        clean_text (str): The cleaned dialogue text sent to the API.
+        voice_id (str): The ElevenLabs voice ID.
+        model_id (str): The synthesis model ID.
+        voice_settings (dict): The voice settings sent with the request.
+        output_format (str): The audio format, e.g. 'mp3' or 'ogg'.
+    Returns:
+        str: A hex SHA-256 digest identifying the audio.
+    """
+    payload = json.dumps(
+        [clean_text, voice_id, model_id, voice_settings, output_format],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class AudioCache:
+    """
+    Persistent on-disk store of synthesized audio, keyed by make_cache_key.
+    Files live at <cache_dir>/<first two hex chars>/<key>.<format>. The least
+    recently used files are evicted once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+
+    def path_for(self, key, output_format):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{output_format}")
+
+    def lookup(self, key, output_format):
+        """
+        Returns the cached file path for a key, or None on a miss.
+        A hit refreshes the file's mtime so it counts as recently used.
+        """
+        path = self.path_for(key, output_format)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def contains(self, key, output_format):
+        """
+        Reports whether a key is cached, without counting it as used.
+        """
+        return os.path.exists(self.path_for(key, output_format))
+
+    def put(self, key, output_format, audio):
+        """
+        Stores audio bytes under a key, then evicts old entries if over budget.
+        Returns:
+            str: The cached file path.
+        """
+        path = self.path_for(key, output_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if not existed:
+                self.total_bytes += len(audio)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def copy_to(self, cached_path, dest_path):
+        """
+        Places a cached file at dest_path, hard-linking when the filesystem allows it.
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(cached_path, dest_path)
+        except OSError:
+            shutil.copyfile(cached_path, dest_path)
+
+    def _scan(self):
+        """
+        Yields (path, size, mtime) for every cached file.
+        """
+        for root, dirs, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.endswith('.tmp'):
+                    continue
+                file_path = os.path.join(root, file)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                yield file_path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """
+        Removes least recently used files until the cache is at 90% of its budget.
+        Must be called with the lock held.
+        """
+        target = int(self.max_bytes * 0.9)
+        files = sorted(self._scan(), key=lambda item: item[2])
+        self.total_bytes = sum(size for _, size, _ in files)
+        for file_path, size, _ in files:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
@@ -0,0 +1,141 @@
+# audio_post.py
+
+import io
+import multiprocessing
+import time
+import wave
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# NumPy is only needed for trimming and loudness normalization; plain WAV output works without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Raw audio requested from ElevenLabs for WAV output: 16-bit little-endian mono at 44.1 kHz
+PCM_API_FORMAT = 'pcm_44100'
+PCM_SAMPLE_RATE = 44100
+
+DEFAULT_SETTINGS = {
+    'target_dbfs': -20.0,  # Loudness each line is brought to
+    'peak_dbfs': -1.0,  # Gain is reduced if it would push a peak above this
+    'silence_dbfs': -50.0,  # 10 ms frames quieter than this count as silence when trimming
+    'pad_ms': 50,  # Silence kept before the first and after the last sound
+}
+
+def postprocessing_available():
+    return np is not None
+
+def pcm_to_wav(pcm, sample_rate=PCM_SAMPLE_RATE):
+    """
+    Wraps raw 16-bit mono PCM in a WAV container.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm[:len(pcm) - len(pcm) % 2])
+    return buffer.getvalue()
+
+def to_dbfs(power):
+    return 10 * np.log10(np.maximum(power, 1e-12))
+
+def loudness_dbfs(samples, sample_rate, block_ms=400):
+    """
+    Measures loudness as the mean power of 400 ms blocks, ignoring blocks below -70 dBFS and then those more
+    than 10 dB below the rest, the gating used by ITU-R BS.1770 (without its K-weighting filter).
+    """
+    block = max(1, int(sample_rate * block_ms / 1000))
+    count = len(samples) // block
+    blocks = samples[:count * block].reshape(count, block) if count else samples[None, :]
+    power = np.mean(blocks ** 2, axis=1)
+    gated = power[to_dbfs(power) > -70.0]
+    if not len(gated):
+        return None
+    gated = gated[to_dbfs(gated) > to_dbfs(np.mean(gated)) - 10.0]
+    return float(to_dbfs(np.mean(gated)))
+
+def trim_silence(samples, sample_rate, silence_dbfs, pad_ms):
+    """
+    Removes leading and trailing silence, keeping pad_ms around the sound. Silent lines are left as they are.
+    """
+    frame = max(1, sample_rate // 100)
+    count = len(samples) // frame
+    if count == 0:
+        return samples
+    power = np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1)
+    loud = np.flatnonzero(to_dbfs(power) > silence_dbfs)
+    if not len(loud):
+        return samples
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, loud[0] * frame - pad)
+    end = min(len(samples), (loud[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+def process_pcm(pcm, sample_rate=PCM_SAMPLE_RATE, settings=None):
+    """
+    Trims silence from a line of raw 16-bit mono PCM, brings it to the target loudness and returns it as WAV.
+    Runs in a worker process.
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2').astype(np.float32) / 32768.0
+    samples = trim_silence(samples, sample_rate, settings['silence_dbfs'], settings['pad_ms'])
+
+    loudness = loudness_dbfs(samples, sample_rate)
+    if loudness is not None:
+        gain_db = settings['target_dbfs'] - loudness
+        peak = float(np.max(np.abs(samples)))
+        if peak > 0:
+            gain_db = min(gain_db, settings['peak_dbfs'] - 20 * np.log10(peak))
+        samples = samples * (10 ** (gain_db / 20))
+
+    output = np.clip(np.round(samples * 32768.0), -32768, 32767).astype('<i2')
+    return pcm_to_wav(output.tobytes(), sample_rate)
+
+def create_pool(max_workers=None):
+    """
+    Creates the process pool post-processing runs in. Processes are spawned rather than forked,
+    since the callers already run threads.
+    """
+    if np is None:
+        raise RuntimeError("Audio post-processing requires NumPy: pip install numpy")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+class AudioPostProcessor:
+    """
+    Post-processes one job's lines in a shared process pool while synthesis continues, handing each
+    result back on the submitting thread in submission order.
+    """
+
+    def __init__(self, pool, settings=None, max_pending=64):
+        """
+        Args:
+            pool (ProcessPoolExecutor): From create_pool; may be shared by several jobs.
+            settings (dict): Overrides for DEFAULT_SETTINGS.
+            max_pending (int): Lines in flight before submit waits for the oldest, bounding memory.
+        """
+        self.pool = pool
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.max_pending = max(1, int(max_pending))
+        self.wait_seconds = 0.0  # Time the submitting thread spent waiting for results
+        self._pending = deque()
+
+    def submit(self, pcm, on_done, *args):
+        """
+        Queues a line of raw PCM. on_done(wav, *args) is called once it and every earlier line are done.
+        """
+        self._pending.append((self.pool.submit(process_pcm, pcm, PCM_SAMPLE_RATE, self.settings), on_done, args))
+        self.collect()
+
+    def collect(self, wait_all=False):
+        """
+        Hands back finished results, waiting for the oldest while too many are in flight (or all, with wait_all).
+        """
+        while self._pending and (wait_all or len(self._pending) > self.max_pending or self._pending[0][0].done()):
+            future, on_done, args = self._pending.popleft()
+            start = time.monotonic()
+            wav = future.result()
+            self.wait_seconds += time.monotonic() - start
+            on_done(wav, *args)
@@ -0,0 +1,114 @@
+# bench_cleaner.py
+#
+# Checks that the compiled cleaner matches the original sequential cleaner
+# byte for byte, and compares their speed.
+# Run from the repository root:  python -m benchmarks.bench_cleaner
+
+import argparse
+import csv
+import random
+import re
+import time
+
+from parsing_functions import clean_dialogue_text, remove_items, replace_items
+
+def legacy_clean_dialogue_text(dialogueText):
+    """
+    The original cleaner: one str.replace pass per rule, then seven regex passes.
+    """
+    if not dialogueText:
+        return ''
+
+    # Remove unwanted items
+    for item in remove_items:
+        dialogueText = dialogueText.replace(item, '')
+
+    # Replace specified items
+    for old, new in replace_items.items():
+        dialogueText = dialogueText.replace(old, new)
+
+    dialogueText = re.sub(r'\{\{.*?\}\}', '', dialogueText)   # {{...}}
+    dialogueText = re.sub(r'\[\[.*?\]\]', '', dialogueText)   # [[...]]
+    dialogueText = re.sub(r'<.*?>', '', dialogueText)         # <...>
+    dialogueText = re.sub(r'\\[rn]', '', dialogueText)        # \r and \n
+    dialogueText = re.sub(r'\.\.\.', '', dialogueText)        # ...
+    dialogueText = re.sub(r'“', '"', dialogueText)
+    dialogueText = re.sub(r'”', '"', dialogueText)
+
+    # Normalize whitespace
+    dialogueText = ' '.join(dialogueText.split())
+    return dialogueText.strip()
+
+# Text where one rule's output forms another rule's text, which the exports rarely contain
+CHAINED_CASES = [
+    'TK',
+    'T*K',
+    '{*{foo}}',
+    'a..*.b',
+    'C-c-c',
+    'C*-c-c',
+    '\\*n',
+    '[[a*b]*]',
+    '<co*lor>',
+    '(bright*ly)',
+    'say “T…K”',
+    '[e[em1]m2]',
+    '.{{PLACEHOLDER - X}}..x',
+    '<<color=#35F>',
+    '{{a<b}}>',
+    '[[x<]]>y',
+]
+
+def random_texts(count, seed=0):
+    """
+    Generates texts made of pieces of the cleaning rules, so that rules overlap and form one another far
+    more often than in real exports.
+    """
+    rng = random.Random(seed)
+    fragments = ['{{', '}}', '[[', ']]', '<', '>', '\\', 'r', 'n', '.', ' ', '-', 'a', 'T', 'K', 'C', 'c']
+    for rule in list(remove_items) + list(replace_items) + list(replace_items.values()):
+        fragments.extend([rule, rule[:len(rule) // 2], rule[len(rule) // 2:]])
+    return [''.join(rng.choice(fragments) for _ in range(rng.randint(1, 8))) for _ in range(count)]
+
+def read_cells(csv_file):
+    """
+    Returns every cell of the export, so the comparison covers more than DialogueText.
+    """
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return [cell for row in csv.reader(f) for cell in row]
+
+def time_cleaner(cleaner, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            cleaner(text)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the compiled and sequential dialogue cleaners.")
+    parser.add_argument('files', nargs='*', default=['dialogue.csv', 'dialogue2.csv'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--random', type=int, default=100000, help="Random texts to compare the cleaners on")
+    args = parser.parse_args()
+
+    mismatches = [text for text in CHAINED_CASES if clean_dialogue_text(text) != legacy_clean_dialogue_text(text)]
+    print(f"chained cases: {len(CHAINED_CASES)} texts, {len(mismatches)} mismatches")
+    for text in mismatches:
+        print(f"  mismatch: {text!r} -> {clean_dialogue_text(text)!r}, expected {legacy_clean_dialogue_text(text)!r}")
+
+    texts = random_texts(args.random)
+    mismatches = [text for text in texts if clean_dialogue_text(text) != legacy_clean_dialogue_text(text)]
+    print(f"random texts: {len(texts)} texts, {len(mismatches)} mismatches")
+    for text in mismatches[:5]:
+        print(f"  mismatch: {text!r} -> {clean_dialogue_text(text)!r}, expected {legacy_clean_dialogue_text(text)!r}")
+
+    for csv_file in args.files:
+        texts = read_cells(csv_file)
+        mismatches = [text for text in texts if clean_dialogue_text(text) != legacy_clean_dialogue_text(text)]
+        legacy_seconds = time_cleaner(legacy_clean_dialogue_text, texts, args.repeat)
+        compiled_seconds = time_cleaner(clean_dialogue_text, texts, args.repeat)
+        print(f"{csv_file}: {len(texts)} cells, {len(mismatches)} mismatches, "
+              f"sequential {legacy_seconds:.3f}s, compiled {compiled_seconds:.3f}s "
+              f"({legacy_seconds / compiled_seconds:.1f}x)")
+        for text in mismatches[:5]:
+            print(f"  mismatch: {text!r}")
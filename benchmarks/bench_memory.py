@@ -0,0 +1,103 @@
+# bench_memory.py
+#
+# Measures the memory held by parsed entries on an export scaled up from
+# dialogue2.csv, comparing the compact Entry with the original one.
+# Run from the repository root:  python -m benchmarks.bench_memory
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+
+import parsing_functions
+from parsing_functions import parse_dialogue_csv
+
+class LegacyEntry:
+    """
+    The original Entry: a per-instance __dict__, its own text fields and a character name
+    re-derived from the entrytag.
+    """
+
+    def __init__(self, entrytag, voiceID=None, voiceName=None, rawText=''):
+        self.entrytag = entrytag
+        self.voiceID = voiceID
+        self.voiceName = voiceName
+        self.rawText = rawText
+        self.cleanText = None
+        self.characterName = '_'.join(entrytag.split('_')[1:-1])
+
+_last_text = {}
+
+def legacy_entry(entrytag, voiceID, voiceName, text):
+    # Built the way the original parser did, one Entry per voice. The original cleaner always
+    # returned a new string, shared only by the Player entries of the same line.
+    if _last_text.get('text') is not text:
+        _last_text.update(text=text, clean=' '.join(text.clean.split()))
+    entry = LegacyEntry(entrytag, voiceID=voiceID, voiceName=voiceName, rawText=text.raw)
+    entry.cleanText = _last_text['clean']
+    return entry
+
+def write_scaled_csv(source_csv, scale, output_path):
+    """
+    Writes an export whose DialogueEntries section repeats that of source_csv scale times,
+    with each copy's entrytags made unique.
+    Returns:
+        int: The number of dialogue rows written.
+    """
+    with open(source_csv, 'r', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+
+    start = next(index for index, row in enumerate(rows) if row and row[0] == 'DialogueEntries')
+    headers = [header.strip() for header in rows[start + 1]]
+    entrytag_index = headers.index('entrytag')
+    end = start + 3
+    while end < len(rows) and rows[end] and rows[end][0] != 'OutgoingLinks':
+        end += 1
+    dialogue_rows = rows[start + 3:end]
+
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerows(rows[:start + 3])
+        for copy in range(scale):
+            for row in dialogue_rows:
+                row = list(row)
+                row[entrytag_index] = f"{copy}x{row[entrytag_index]}"
+                writer.writerow(row)
+        writer.writerows(rows[end:])
+    return len(dialogue_rows) * scale
+
+def measure(csv_file, voices_file):
+    tracemalloc.start()
+    start = time.perf_counter()
+    entries = parse_dialogue_csv(csv_file, voices_file)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(entries), retained, peak, elapsed
+
+def run_benchmark(csv_file, voices_file, scale):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scaled_csv = os.path.join(tmp_dir, 'scaled.csv')
+        rows = write_scaled_csv(csv_file, scale, scaled_csv)
+        print(f"{rows} dialogue rows ({csv_file} x{scale})")
+
+        compact_entry = parsing_functions.Entry
+        for label, factory in (('original', legacy_entry), ('compact', compact_entry)):
+            parsing_functions.Entry = factory
+            try:
+                count, retained, peak, elapsed = measure(scaled_csv, voices_file)
+            finally:
+                parsing_functions.Entry = compact_entry
+            print(f"{label:<9} entries={count} retained={retained / 2**20:.1f} MiB "
+                  f"({retained / max(count, 1):.0f} B/entry) peak={peak / 2**20:.1f} MiB parse={elapsed:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory held by parsed entries.")
+    parser.add_argument('--dialogue', default='dialogue2.csv')
+    parser.add_argument('--voices', default='VoiceAssignments.json')
+    parser.add_argument('--scale', type=int, default=100, help="Number of copies of the dialogue entries")
+    args = parser.parse_args()
+
+    run_benchmark(args.dialogue, args.voices, args.scale)
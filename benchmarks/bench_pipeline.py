@@ -0,0 +1,198 @@
+# bench_pipeline.py
+#
+# Benchmarks parsing, cleaning and the full synthesis pipeline on synthetic exports,
+# against the local stub server, reporting throughput, latency percentiles and peak RSS.
+# Each stage runs in its own process so its peak RSS is measured on its own.
+# Run from the repository root:  python -m benchmarks.bench_pipeline --rows 1000 10000
+#
+# Save a run with --save results.json and compare later runs with --compare results.json;
+# the exit status is 1 when any stage regresses by more than --tolerance.
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+STAGES = ('parse', 'clean', 'pipeline')
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_parse(dialogue_path, voices_path, **options):
+    from parsing_functions import iter_dialogue_csv
+
+    latencies = []
+    count = 0
+    start = time.perf_counter()
+    iterator = iter_dialogue_csv(dialogue_path, voices_path)
+    while True:
+        line_start = time.perf_counter()
+        entry = next(iterator, None)
+        if entry is None:
+            break
+        latencies.append(time.perf_counter() - line_start)
+        count += 1
+    return count, time.perf_counter() - start, latencies
+
+def bench_clean(dialogue_path, voices_path, **options):
+    import csv
+    from parsing_functions import clean_dialogue_text
+
+    with open(dialogue_path, 'r', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    start_row = next(index for index, row in enumerate(rows) if row and row[0] == 'DialogueEntries')
+    text_index = rows[start_row + 1].index('DialogueText')
+    texts = [row[text_index] for row in rows[start_row + 3:] if len(row) > text_index]
+    del rows
+
+    latencies = []
+    start = time.perf_counter()
+    for text in texts:
+        line_start = time.perf_counter()
+        clean_dialogue_text(text)
+        latencies.append(time.perf_counter() - line_start)
+    return len(texts), time.perf_counter() - start, latencies
+
+def bench_pipeline(dialogue_path, voices_path, latency=0.05, error_rate=0.0, workers=8, **options):
+    from benchmarks.stub_tts_server import stub_tts_server
+
+    work_dir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with stub_tts_server(latency=latency, error_rate=error_rate, retry_after=0) as api_url:
+            os.environ.update({
+                'ELEVENLABS_API_URL': api_url,
+                'SYNTHESIS_WORKERS': str(workers),
+                'API_KEY_CONCURRENCY': str(workers),
+                'RETRY_BASE_DELAY': '0.05',
+                'JOB_DB_PATH': os.path.join(work_dir, 'jobs.sqlite3'),
+                'AUDIO_CACHE_DIR': os.path.join(work_dir, 'audio_cache'),
+            })
+            import jwt
+            import synthesis
+            import app
+
+            # Client-side latency of every API call, retries included
+            latencies = []
+            synthesize = synthesis.SynthesisEngine.synthesize
+
+            def timed_synthesize(engine, entry):
+                call_start = time.perf_counter()
+                try:
+                    return synthesize(engine, entry)
+                finally:
+                    latencies.append(time.perf_counter() - call_start)
+            synthesis.SynthesisEngine.synthesize = timed_synthesize
+
+            token = jwt.encode({'api_key': 'bench-key'}, app.JWT_SECRET_KEY, algorithm="HS256")
+            job_id = 'bench'
+            app.job_store.create_job(job_id, 'bench', dialogue_path, voices_path, token, 'mp3')
+            start = time.perf_counter()
+            app.process_audio_files(dialogue_path, voices_path, token, 'mp3', job_id)
+            elapsed = time.perf_counter() - start
+            job = app.job_store.get_job(job_id)
+    finally:
+        # The job's uploads, cache and database are only needed while it runs
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return job['throughput']['succeeded'], elapsed, latencies
+
+def run_stage(stage, dialogue_path, voices_path, options):
+    """
+    Runs one stage in this process and returns its measurements.
+    """
+    bench = {'parse': bench_parse, 'clean': bench_clean, 'pipeline': bench_pipeline}[stage]
+    lines, elapsed, latencies = bench(dialogue_path, voices_path, **options)
+    return {
+        'lines': lines,
+        'elapsed_seconds': round(elapsed, 3),
+        'lines_per_second': round(lines / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+def run_stage_in_subprocess(stage, dialogue_path, voices_path, args):
+    command = [sys.executable, '-m', 'benchmarks.bench_pipeline', '--run-stage', stage,
+               '--dialogue', dialogue_path, '--voices', voices_path, '--latency', str(args.latency),
+               '--error-rate', str(args.error_rate), '--workers', str(args.workers)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])))
+    output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+    # The result is the last line; everything before it is the pipeline's own logging
+    return json.loads(output.strip().splitlines()[-1])
+
+def compare(results, baseline, tolerance):
+    """
+    Lists stages whose throughput fell, or whose p99 latency or peak RSS grew, by more than tolerance.
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if not before:
+            continue
+        if result['lines_per_second'] < before['lines_per_second'] * (1 - tolerance):
+            regressions.append(f"{key}: {before['lines_per_second']} -> {result['lines_per_second']} lines/sec")
+        for metric in ('p99_ms', 'peak_rss_mb'):
+            if before[metric] and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{key}: {metric} {before[metric]} -> {result[metric]}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, cleaning and synthesis offline.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help="Export sizes to generate")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds of simulated API latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of API calls answered with 429 or 503")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent API requests in the pipeline stage")
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Compare against results saved earlier with --save")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression before failing")
+    parser.add_argument('--run-stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--dialogue', help=argparse.SUPPRESS)
+    parser.add_argument('--voices', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        options = {'latency': args.latency, 'error_rate': args.error_rate, 'workers': args.workers}
+        print(json.dumps(run_stage(args.run_stage, args.dialogue, args.voices, options)))
+        return 0
+
+    from benchmarks.synthetic_export import generate_export
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            dialogue_path, voices_path = generate_export(os.path.join(tmp_dir, str(rows)), rows)
+            for stage in args.stages:
+                result = run_stage_in_subprocess(stage, dialogue_path, voices_path, args)
+                results[f"{stage}/{rows}"] = result
+                print(f"{stage:<9} rows={rows:<8} lines={result['lines']:<8} "
+                      f"{result['lines_per_second']:>10.1f} lines/sec  p50={result['p50_ms']:.3f} ms  "
+                      f"p99={result['p99_ms']:.3f} ms  peak RSS={result['peak_rss_mb']:.1f} MB")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# bench_synthesis.py
+#
+# Compares sequential and pooled synthesis against the local stub server.
+# Run from the repository root:  python -m benchmarks.bench_synthesis
+
+import argparse
+
+from parsing_functions import parse_dialogue_csv
+from synthesis import SynthesisEngine
+from benchmarks.stub_tts_server import stub_tts_server
+
+def run_benchmark(csv_file, voices_file, latency, worker_counts, limit):
+    entries = parse_dialogue_csv(csv_file, voices_file)[:limit]
+    print(f"{len(entries)} entries, {latency * 1000:.0f} ms simulated latency")
+
+    with stub_tts_server(latency=latency) as api_url:
+        for workers in worker_counts:
+            engine = SynthesisEngine(
+                f"bench-key-{workers}",
+                output_format='mp3',
+                api_url=api_url,
+                max_workers=workers
+            )
+            stats = engine.run(entries, lambda entry, audio: None)
+            print(f"workers={workers:<3} elapsed={stats['elapsed_seconds']:.2f}s "
+                  f"throughput={stats['lines_per_second']:.1f} lines/sec "
+                  f"connections={stats['connections_opened']} reuse={stats['connection_reuse_rate']:.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the synthesis engine offline.")
+    parser.add_argument('--dialogue', default='dialogue.csv')
+    parser.add_argument('--voices', default='VoiceAssignments.json')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--limit', type=int, default=200, help="Number of entries to synthesize")
+    args = parser.parse_args()
+
+    run_benchmark(args.dialogue, args.voices, args.latency, args.workers, args.limit)
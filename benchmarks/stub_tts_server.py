@@ -0,0 +1,123 @@
+# stub_tts_server.py
+
+import argparse
+import json
+import math
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fake audio payload returned for every successful synthesis request
+STUB_AUDIO = b'ID3' + b'\x00' * 1024
+
+def make_stub_pcm(sample_rate=44100, tone_seconds=0.5, silence_seconds=0.3, amplitude=0.05):
+    """
+    Builds the raw 16-bit mono PCM returned for pcm_* output formats: a quiet tone between stretches
+    of silence, so trimming and loudness normalization have something to do.
+    """
+    silence = b'\x00\x00' * int(sample_rate * silence_seconds)
+    tone = b''.join(
+        struct.pack('<h', int(32767 * amplitude * math.sin(2 * math.pi * 440 * i / sample_rate)))
+        for i in range(int(sample_rate * tone_seconds))
+    )
+    return silence + tone + silence
+
+STUB_PCM = make_stub_pcm()
+
+class StubTTSServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Avoid refused connections when many workers connect at once
+
+def make_handler(latency, error_rate=0.0, retry_after=1, voice_ids=()):
+    """
+    Builds a request handler class that mimics the ElevenLabs endpoints used by the app.
+    Args:
+        latency (float): Seconds to sleep before answering each text-to-speech request.
+        error_rate (float): Fraction of text-to-speech requests answered with a 429 or 503.
+        retry_after (int): Retry-After seconds sent with simulated 429 responses.
+        voice_ids (iterable): Voices listed by /v1/voices. When given, other voices are answered with a 404.
+    """
+    voice_ids = set(voice_ids)
+    voices_body = json.dumps({'voices': [{'voice_id': voice_id, 'name': voice_id} for voice_id in sorted(voice_ids)]})
+
+    class StubTTSHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep connections open between requests, like the real API
+        disable_nagle_algorithm = True  # Headers and body are written separately; avoid delayed-ACK stalls
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/v1/voices':
+                self._send(200, voices_body.encode('utf-8'), 'application/json')
+            else:
+                self._send(404, b'{"detail": "not found"}', 'application/json')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            if not self.path.startswith('/v1/text-to-speech/'):
+                self._send(404, b'{"detail": "not found"}', 'application/json')
+                return
+            voice_id = self.path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+            if voice_ids and voice_id not in voice_ids:
+                self._send(404, b'{"detail": {"status": "voice_not_found"}}', 'application/json')
+                return
+            time.sleep(latency)
+            if random.random() < error_rate:
+                if random.random() < 0.5:
+                    self._send(429, b'{"detail": "too_many_concurrent_requests"}', 'application/json',
+                               {'Retry-After': str(retry_after)})
+                else:
+                    self._send(503, b'{"detail": "service unavailable"}', 'application/json')
+                return
+            if 'output_format=pcm_' in self.path:
+                self._send(200, STUB_PCM, 'audio/pcm')
+            else:
+                self._send(200, STUB_AUDIO, self.headers.get('Accept', 'audio/mpeg'))
+
+        def _send(self, status, body, content_type, extra_headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            for name, value in (extra_headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output readable
+
+    return StubTTSHandler
+
+@contextmanager
+def stub_tts_server(latency=0.05, error_rate=0.0, retry_after=1, host='127.0.0.1', port=0, voice_ids=()):
+    """
+    Runs the stub server on a background thread for the duration of the with-block.
+    Yields:
+        str: The base URL to use as ELEVENLABS_API_URL.
+    """
+    server = StubTTSServer((host, port), make_handler(latency, error_rate, retry_after, voice_ids))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub ElevenLabs text-to-speech server for offline testing.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds of simulated latency per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429 or 503")
+    parser.add_argument('--voices', help="VoiceAssignments.json whose voices the stub lists and accepts")
+    args = parser.parse_args()
+
+    voice_ids = ()
+    if args.voices:
+        with open(args.voices, 'r', encoding='utf-8') as f:
+            voice_ids = [char['Voice ID'] for char in json.load(f).get('Character', []) if char.get('Voice ID')]
+    server = StubTTSServer(('127.0.0.1', args.port), make_handler(args.latency, args.error_rate, voice_ids=voice_ids))
+    print(f"Stub TTS server listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
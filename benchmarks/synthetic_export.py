@@ -0,0 +1,122 @@
+# synthetic_export.py
+#
+# Generates a Dialogue System export and a matching VoiceAssignments.json of any size,
+# so the pipeline can be benchmarked without real project data.
+# Run from the repository root:  python -m benchmarks.synthetic_export --rows 100000 --out-dir /tmp/export
+
+import argparse
+import csv
+import json
+import os
+import random
+
+DIALOGUE_HEADERS = ['entrytag', 'ConvID', 'ID', 'Actor', 'Conversant', 'Title', 'MenuText', 'DialogueText',
+                    'IsGroup', 'FalseConditionAction', 'ConditionPriority', 'Conditions', 'Script', 'Sequence',
+                    'Pictures', 'Description', 'Parenthetical', 'Audio Files', 'Video File', 'EventGuid',
+                    'Spoken Dialogue', 'Response Menu Sequence', 'canvasRect']
+DIALOGUE_TYPES = ['Text', 'Number', 'Number', 'Number', 'Number', 'Text', 'Text', 'Text', 'Boolean', 'Special',
+                  'Special', 'Text', 'Text', 'Text', 'Files', 'Text', 'Text', 'Files', 'Text', 'Text', 'Text',
+                  'Text', 'Text']
+
+# Short lines repeated throughout real exports
+BARKS = ['Okay.', "Let's go!", 'Hmm...', 'Yes.', 'No.', 'Thank you!', 'Wait!', 'Over here!']
+
+WORDS = ('the water sample shows evidence that our argument needs more data about the river and its '
+         'temperature so we should check the claim against what we observed near the dam today').split()
+
+# Markup found in exports, which the cleaner has to remove or replace
+MARKUP = ['[em1]{0}[/em1]', '{{{{default}}}} {0}', '{0} [[note]]', '<b>{0}</b>', '{0} [var=PlayerName]']
+
+def make_line(rng, repeat_ratio):
+    if rng.random() < repeat_ratio:
+        return rng.choice(BARKS)
+    words = rng.choices(WORDS, k=rng.randint(4, 30))
+    text = ' '.join(words).capitalize() + rng.choice('.!?')
+    if rng.random() < 0.2:
+        text = rng.choice(MARKUP).format(text)
+    return text
+
+def write_voice_assignments(path, characters, player_voices):
+    """
+    Writes a VoiceAssignments.json with one voice per character and several for the Player.
+    """
+    assignments = [
+        {'ID': str(index), 'Name': name, 'Voice ID': f"voice{index:04d}", 'Voice Name': f"Voice {index}"}
+        for index, name in enumerate(characters, start=1)
+    ]
+    for index in range(player_voices):
+        voice_number = len(characters) + index + 1
+        assignments.append({'ID': str(voice_number), 'Name': 'Player', 'Voice ID': f"voice{voice_number:04d}",
+                            'Voice Name': f"Player Voice {index + 1}"})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'Character': assignments}, f, indent=4)
+
+def generate_export(out_dir, rows, num_characters=12, player_voices=2, player_ratio=0.3, repeat_ratio=0.1,
+                    rows_per_conversation=50, seed=0):
+    """
+    Writes dialogue.csv and VoiceAssignments.json to out_dir.
+    Args:
+        rows (int): Number of dialogue entries.
+        num_characters (int): Number of non-Player characters.
+        player_voices (int): Number of voices assigned to the Player.
+        player_ratio (float): Fraction of lines spoken by the Player.
+        repeat_ratio (float): Fraction of lines that are short repeated barks.
+        rows_per_conversation (int): Entries per conversation.
+        seed (int): Random seed, so the same arguments produce the same files.
+    Returns:
+        tuple: (dialogue CSV path, voices JSON path).
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    characters = [f"Character{index:02d}" for index in range(1, num_characters + 1)]
+    dialogue_path = os.path.join(out_dir, 'dialogue.csv')
+    voices_path = os.path.join(out_dir, 'VoiceAssignments.json')
+    write_voice_assignments(voices_path, characters, player_voices)
+
+    num_conversations = max(1, -(-rows // rows_per_conversation))
+    with open(dialogue_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Database'])
+        writer.writerow(['Name', 'Version', 'Author', 'Description'])
+        writer.writerow(['SyntheticDatabase', '', '', ''])
+        writer.writerow(['Conversations'])
+        writer.writerow(['ID', 'Title', 'Description'])
+        writer.writerow(['Number', 'Text', 'Text'])
+        for conversation in range(1, num_conversations + 1):
+            writer.writerow([conversation, f"Conversation {conversation}", ''])
+        writer.writerow(['DialogueEntries'])
+        writer.writerow(DIALOGUE_HEADERS)
+        writer.writerow(DIALOGUE_TYPES)
+        for row in range(rows):
+            conversation = row // rows_per_conversation + 1
+            entry_id = row % rows_per_conversation
+            speaker = 'Player' if rng.random() < player_ratio else rng.choice(characters)
+            values = dict.fromkeys(DIALOGUE_HEADERS, '')
+            values.update({
+                'entrytag': f"{conversation}_{speaker}_{entry_id}",
+                'ConvID': conversation,
+                'ID': entry_id,
+                'DialogueText': make_line(rng, repeat_ratio),
+                'IsGroup': 'False',
+                'FalseConditionAction': 'Block',
+                'ConditionPriority': 'Normal',
+            })
+            writer.writerow([values[header] for header in DIALOGUE_HEADERS])
+        writer.writerow([])
+        writer.writerow(['OutgoingLinks'])
+    return dialogue_path, voices_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dialogue export for benchmarking.")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--out-dir', default='synthetic_export')
+    parser.add_argument('--characters', type=int, default=12)
+    parser.add_argument('--player-voices', type=int, default=2)
+    parser.add_argument('--repeat-ratio', type=float, default=0.1, help="Fraction of lines that are repeated barks")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dialogue_path, voices_path = generate_export(args.out_dir, args.rows, num_characters=args.characters,
+                                                 player_voices=args.player_voices,
+                                                 repeat_ratio=args.repeat_ratio, seed=args.seed)
+    print(f"Wrote {args.rows} entries to {dialogue_path} and voices to {voices_path}")
@@ -0,0 +1,224 @@
+# cli.py
+#
+# Headless batch runner: synthesizes one or more dialogue exports without the web app,
+# using the same engine, audio cache and settings.
+#
+#   ELEVENLABS_API_KEY=... python cli.py export1.csv export2.csv --voices VoiceAssignments.json \
+#       --format mp3 --concurrency 8 --parallel 2 --output-dir output
+#
+# With --shards N each export is split by conversation (or character) across N processes,
+# and the shards are merged into one archive with a combined manifest.
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+
+import requests
+
+from audio_cache import AudioCache
+from audio_post import AudioPostProcessor, create_pool, postprocessing_available
+from export_index import parse_filter
+from http_client import HTTPClient
+from metrics import log_event
+from parsing_functions import get_assigned_voice_ids
+from pipeline import run_export
+from rate_limit import RetryPolicy
+from sharding import SHARD_BY, shard_folder, merge_shards, merge_stats
+from synthesis import SynthesisEngine, DEFAULT_API_URL
+from voice_catalog import VoiceCatalog
+
+def export_name(dialogue_file_path):
+    """
+    Names an export's output folder after its CSV file, e.g. 'chapter1' for 'exports/chapter1.csv'.
+    """
+    return os.path.splitext(os.path.basename(dialogue_file_path))[0]
+
+def build_cache(args):
+    return AudioCache(args.cache_dir, args.cache_max_bytes)
+
+def build_http_client(args, pool_maxsize):
+    return HTTPClient(
+        connect_timeout=float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5.0)),
+        read_timeout=float(os.environ.get('HTTP_READ_TIMEOUT', 60.0)),
+        pool_maxsize=max(16, pool_maxsize)
+    )
+
+def run_one(dialogue_file_path, args, cache, http_client, date_stamp, shard=None):
+    """
+    Synthesizes one export, or one shard of it, into its folder under the output directory.
+    """
+    name = export_name(dialogue_file_path)
+    job_folder = os.path.join(args.output_dir, name)
+    if shard is not None:
+        job_folder = shard_folder(job_folder, shard[1])
+        name = f"{name} shard {shard[1] + 1}/{shard[2]}"
+    engine = SynthesisEngine(
+        args.api_key,
+        output_format=args.format,
+        api_url=args.api_url,
+        max_workers=args.concurrency,
+        key_concurrency=args.concurrency,
+        cache=cache,
+        http_client=http_client,
+        retry_policy=RetryPolicy(
+            max_attempts=args.max_attempts,
+            base_delay=float(os.environ.get('RETRY_BASE_DELAY', 1.0)),
+            max_delay=float(os.environ.get('RETRY_MAX_DELAY', 60.0))
+        )
+    )
+
+    def report_progress(progress):
+        log_event('export_progress', f"{name}: {progress['succeeded']} lines done, {progress['failed']} failed "
+                  f"({progress['lines_per_second']} lines/sec)", job_id=name, succeeded=progress['succeeded'],
+                  failed=progress['failed'], lines_per_second=progress['lines_per_second'])
+
+    postprocessor = None
+    if args.postprocess and args.format == 'wav':
+        # Each export (or shard process) has its own pool of --postprocess-workers processes
+        pool = create_pool(args.postprocess_workers)
+        postprocessor = AudioPostProcessor(pool, settings={'target_dbfs': args.target_dbfs,
+                                                           'silence_dbfs': args.silence_dbfs})
+
+    try:
+        return run_export(
+            engine, dialogue_file_path, args.voices,
+            job_folder=job_folder,
+            date_stamp=date_stamp,
+            job_id=name,
+            keep_loose_files=not args.zip_only,
+            limit=args.limit,
+            selection=parse_filter(args.select) if args.select else None,
+            shard=shard,
+            postprocessor=postprocessor,
+            on_progress=report_progress,
+            progress_interval=args.progress_interval
+        )
+    finally:
+        if postprocessor is not None:
+            postprocessor.pool.shutdown()
+
+def run_shard(dialogue_file_path, args, date_stamp, shard):
+    # Runs in a worker process, so the cache index and connections are its own
+    return run_one(dialogue_file_path, args, build_cache(args), build_http_client(args, args.concurrency),
+                   date_stamp, shard=shard)
+
+def run_sharded(dialogue_file_path, args, date_stamp):
+    """
+    Splits one export into shards synthesized by separate processes, then merges them into one job.
+    """
+    start_time = time.monotonic()
+    # Spawned rather than forked, since this process already runs threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.shards, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_shard, dialogue_file_path, args, date_stamp, (args.shard_by, index, args.shards))
+            for index in range(args.shards)
+        ]
+        results = [future.result() for future in futures]
+
+    merged = merge_shards(os.path.join(args.output_dir, export_name(dialogue_file_path)), date_stamp,
+                          args.shards, keep_loose_files=not args.zip_only)
+    stats = merge_stats([result['stats'] for result in results], time.monotonic() - start_time)
+    log_event('export_merged', f"{dialogue_file_path}: merged {args.shards} shards, {merged['lines']} lines in "
+              f"{stats['elapsed_seconds']}s ({stats['lines_per_second']} lines/sec)",
+              dialogue=dialogue_file_path, **stats)
+    return {
+        'zip_file_path': merged['zip_file_path'],
+        'stats': stats,
+        'failed_entries': [failed for result in results for failed in result['failed_entries']],
+        'delta': merged['delta'],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthesize dialogue exports without the web app.")
+    parser.add_argument('dialogue', nargs='+', help="Dialogue System CSV exports")
+    parser.add_argument('--voices', required=True, help="VoiceAssignments.json shared by every export")
+    parser.add_argument('--format', choices=['mp3', 'ogg', 'wav'], default='ogg')
+    parser.add_argument('--postprocess', action='store_true',
+                        help="Trim silence from WAV lines and normalize their loudness (needs NumPy)")
+    parser.add_argument('--target-dbfs', type=float, default=-20.0, help="Loudness post-processed lines are brought to")
+    parser.add_argument('--silence-dbfs', type=float, default=-50.0, help="Quieter lead-in and tail audio is trimmed")
+    parser.add_argument('--postprocess-workers', type=int, default=2, help="Post-processing processes per export")
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('API_KEY_CONCURRENCY', 4)),
+                        help="Requests in flight for the API key, across all exports")
+    parser.add_argument('--parallel', type=int, default=2, help="Exports processed at once")
+    parser.add_argument('--output-dir', default='output', help="One folder per export is created here")
+    parser.add_argument('--zip-only', action='store_true', help="Write only the zip archive, not loose files")
+    parser.add_argument('--limit', type=int, help="Read at most this many entries from each export")
+    parser.add_argument('--select', help="Only synthesize the lines a filter selects, e.g. 'conversation:30-45 character:Toppo'")
+    parser.add_argument('--api-key', default=os.environ.get('ELEVENLABS_API_KEY'),
+                        help="Defaults to the ELEVENLABS_API_KEY environment variable")
+    parser.add_argument('--api-url', default=os.environ.get('ELEVENLABS_API_URL', DEFAULT_API_URL))
+    parser.add_argument('--cache-dir', default=os.environ.get('AUDIO_CACHE_DIR', 'audio_cache'),
+                        help="Audio cache, shared with the web app when both point at the same folder")
+    parser.add_argument('--cache-max-bytes', type=int,
+                        default=int(os.environ.get('AUDIO_CACHE_MAX_BYTES', 2 * 1024 ** 3)))
+    parser.add_argument('--max-attempts', type=int, default=int(os.environ.get('SYNTHESIS_MAX_ATTEMPTS', 5)))
+    parser.add_argument('--progress-interval', type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Processes each export is split across; --concurrency then applies to each process")
+    parser.add_argument('--shard-by', choices=SHARD_BY, default='conversation')
+    parser.add_argument('--skip-voice-check', action='store_true',
+                        help="Do not check the assigned voices against the API key's voices before starting")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required: pass --api-key or set ELEVENLABS_API_KEY")
+    if args.postprocess and not postprocessing_available():
+        parser.error("--postprocess requires NumPy: pip install numpy")
+    if args.select:
+        try:
+            parse_filter(args.select)
+        except ValueError as e:
+            parser.error(str(e))
+    names = [export_name(path) for path in args.dialogue]
+    if len(set(names)) != len(names):
+        parser.error("exports must have distinct file names, since each gets a folder named after it")
+
+    cache = build_cache(args)
+    http_client = build_http_client(args, args.concurrency * args.parallel)
+    date_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # Every assigned voice is checked in one request, rather than failing each of its lines
+    if not args.skip_voice_check:
+        assigned = get_assigned_voice_ids(args.voices)
+        try:
+            unknown = VoiceCatalog(http_client, args.api_url).find_unknown(args.api_key, assigned)
+        except requests.RequestException as e:
+            log_event('voice_check_failed', f"Could not fetch the API key's voices: {e}", error=str(e))
+            return 1
+        if unknown:
+            log_event('unknown_voices', "Voice IDs not available to the API key: " +
+                      ', '.join(f"{voice_id} ({', '.join(assigned[voice_id])})" for voice_id in unknown),
+                      voice_ids=unknown)
+            return 1
+
+    exit_code = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        if args.shards > 1:
+            futures = {executor.submit(run_sharded, path, args, date_stamp): path for path in args.dialogue}
+        else:
+            futures = {
+                executor.submit(run_one, path, args, cache, http_client, date_stamp): path
+                for path in args.dialogue
+            }
+        for future, path in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                exit_code = 1
+                log_event('export_failed', f"Error processing {path}: {e}", dialogue=path, error=str(e))
+                continue
+            if result['failed_entries']:
+                exit_code = 1
+            log_event('export_completed', f"{path}: {result['stats']['succeeded']} lines, "
+                      f"{len(result['failed_entries'])} failed. Output available at: {result['zip_file_path']}",
+                      dialogue=path, filename=result['zip_file_path'], failed=len(result['failed_entries']))
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
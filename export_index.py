@@ -0,0 +1,234 @@
+# export_index.py
+
+import csv
+import json
+import os
+import uuid
+
+from parsing_functions import iter_dialogue_csv, read_voices, extract_character_name, find_dialogue_columns, entries_for_row, clean_timer
+
+# Bumped whenever the index layout changes, so older index files are rebuilt
+INDEX_VERSION = 1
+
+# Fields a filter expression can select on, with their short forms
+FILTER_FIELDS = {
+    'conversation': 'conversation', 'conv': 'conversation',
+    'character': 'character', 'char': 'character',
+    'entrytag': 'entrytag', 'tag': 'entrytag',
+}
+
+FILTER_SYNTAX = "e.g. 'conversation:30-45 character:Toppo,Player' or 'entrytag:34_Toppo_1..34_Toppo_9'"
+
+class OffsetLines:
+    """
+    Iterates over the lines of a file opened in binary mode, tracking the byte offset of the next line,
+    so the offset of each row a csv.reader returns is known.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = f.tell()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode('utf-8')
+
+def index_path_for(csv_file):
+    return f"{csv_file}.index.json"
+
+def build_index(csv_file):
+    """
+    Reads a Dialogue System export once and records where each dialogue entry's row starts.
+    Returns:
+        dict: 'header_offset' of the DialogueEntries header row and 'rows', one
+            [entrytag, conversation ID, character name, byte offset] per entry in export order.
+    """
+    rows = []
+    header_offset = None
+    with open(csv_file, 'rb') as f:
+        lines = OffsetLines(f)
+        reader = csv.reader(lines)
+        for row in reader:
+            if row and row[0] == 'DialogueEntries':
+                header_offset = lines.offset
+                break
+        headers = next(reader, None) if header_offset is not None else None
+        if headers is not None:
+            headers = [header.strip() for header in headers]
+            entrytag_index = headers.index('entrytag') if 'entrytag' in headers else None
+            conversation_index = headers.index('ConvID') if 'ConvID' in headers else None
+            next(reader, None)  # Skip the column type row
+            while entrytag_index is not None:
+                offset = lines.offset
+                row = next(reader, None)
+                if not row or row[0] == 'OutgoingLinks':
+                    break
+                entrytag = row[entrytag_index].strip()
+                if conversation_index is not None and len(row) > conversation_index and row[conversation_index].strip():
+                    conversation = row[conversation_index].strip()
+                else:
+                    conversation = entrytag.split('_', 1)[0]
+                rows.append([entrytag, conversation, extract_character_name(entrytag), offset])
+
+    stat = os.stat(csv_file)
+    return {'version': INDEX_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'header_offset': header_offset, 'rows': rows}
+
+def load_index(csv_file):
+    """
+    Returns the export's index, read from the file saved next to it while that still matches the export,
+    and built and saved there otherwise.
+    """
+    path = index_path_for(csv_file)
+    stat = os.stat(csv_file)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and index['size'] == stat.st_size and index['mtime'] == stat.st_mtime:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = build_index(csv_file)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        # The index is only a shortcut; a read-only export folder just means building it again next time
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return index
+
+def parse_range(value, separators):
+    for separator in separators:
+        if separator in value:
+            start, end = value.split(separator, 1)
+            return start.strip(), end.strip()
+    return value, value
+
+def parse_filter(expression):
+    """
+    Parses a filter expression selecting part of an export. Terms are separated by spaces and each is
+    field:value[,value...], where field is conversation, character or entrytag. Conversations take
+    numeric ranges such as 30-45 and entry tags take ranges in export order such as 34_Toppo_1..34_Toppo_9.
+    A line is selected when it matches one of the values of every field given.
+    Returns:
+        dict: Field name -> list of values, with ranges as (start, end) tuples.
+    Raises:
+        ValueError: If the expression is malformed.
+    """
+    selection = {}
+    for term in (expression or '').split():
+        field, _, values = term.partition(':')
+        field = FILTER_FIELDS.get(field.lower())
+        if field is None or not values:
+            raise ValueError(f"Invalid filter term '{term}'; {FILTER_SYNTAX}.")
+        for value in filter(None, values.split(',')):
+            if field == 'conversation':
+                start, end = parse_range(value, ('..', '-'))
+                if not (start.isdigit() and end.isdigit()) or int(start) > int(end):
+                    raise ValueError(f"Invalid conversation range '{value}'; {FILTER_SYNTAX}.")
+                selection.setdefault(field, []).append((int(start), int(end)))
+            elif field == 'entrytag':
+                selection.setdefault(field, []).append(parse_range(value, ('..',)))
+            else:
+                selection.setdefault(field, []).append(value.lower())
+    if not selection:
+        raise ValueError(f"The filter is empty; {FILTER_SYNTAX}.")
+    return selection
+
+def in_conversations(conversation, ranges):
+    return conversation.isdigit() and any(start <= int(conversation) <= end for start, end in ranges)
+
+def tag_positions(index, selection):
+    """
+    Resolves the entrytag ranges of a selection to ranges of row positions in the export.
+    Raises:
+        ValueError: If a range names an entry tag that is not in the export.
+    """
+    positions = {}
+    for position, row in enumerate(index['rows']):
+        positions.setdefault(row[0], position)
+    ranges = []
+    for start, end in selection.get('entrytag', []):
+        for tag in (start, end):
+            if tag not in positions:
+                raise ValueError(f"Entry tag '{tag}' is not in the export.")
+        ranges.append((positions[start], positions[end]))
+    return ranges
+
+def select_rows(index, selection):
+    """
+    Returns the index rows a parsed filter selects, in export order.
+    """
+    tag_ranges = tag_positions(index, selection) if 'entrytag' in selection else None
+    selected = []
+    for position, row in enumerate(index['rows']):
+        entrytag, conversation, character, _ = row
+        if 'conversation' in selection and not in_conversations(conversation, selection['conversation']):
+            continue
+        if 'character' in selection and character.lower() not in selection['character']:
+            continue
+        if tag_ranges is not None and not any(start <= position <= end for start, end in tag_ranges):
+            continue
+        selected.append(row)
+    return selected
+
+def filter_manifest(manifest, index, selection):
+    """
+    Narrows an earlier job's manifest to the lines a selection covers, so lines outside it are not
+    reported as removed. Lines no longer in the export are judged by their entry tag alone.
+    """
+    selected_tags = {row[0] for row in select_rows(index, selection)}
+    indexed_tags = {row[0] for row in index['rows']}
+    narrowed = []
+    for line in manifest:
+        entrytag = line['entrytag']
+        if entrytag in indexed_tags:
+            if entrytag in selected_tags:
+                narrowed.append(line)
+            continue
+        if 'entrytag' in selection:
+            continue
+        if 'conversation' in selection and not in_conversations(entrytag.split('_', 1)[0], selection['conversation']):
+            continue
+        if 'character' in selection and extract_character_name(entrytag).lower() not in selection['character']:
+            continue
+        narrowed.append(line)
+    return narrowed
+
+def iter_selected_entries(csv_file, voices_file, index, rows, warn=True):
+    """
+    Yields the entries of the given index rows, seeking to each row rather than reading the whole export.
+    """
+    voice_data = read_voices(voices_file)
+    with open(csv_file, 'rb') as f:
+        f.seek(index['header_offset'])
+        columns = find_dialogue_columns(next(csv.reader(OffsetLines(f)), None))
+        if columns is None:
+            return
+        timer = clean_timer()
+        try:
+            for row in rows:
+                f.seek(row[3])
+                yield from entries_for_row(next(csv.reader(OffsetLines(f))), columns, voice_data, warn, timer)
+        finally:
+            timer.flush()
+
+def iter_export(csv_file, voices_file, selection=None, warn=True):
+    """
+    Yields the entries of a whole export, or only those a parsed filter selects.
+    With warn off, lines whose character has no voice are skipped without being logged.
+    """
+    if selection is None:
+        return iter_dialogue_csv(csv_file, voices_file, warn=warn)
+    index = load_index(csv_file)
+    return iter_selected_entries(csv_file, voices_file, index, select_rows(index, selection), warn)
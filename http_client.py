@@ -0,0 +1,115 @@
+# http_client.py
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Seconds allowed to open a connection and to wait for a response
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# Keep-alive connections kept open per host; should cover the number of requests in flight to one host
+DEFAULT_POOL_MAXSIZE = 16
+
+class _ConnectionCounter:
+    def __init__(self):
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.opened += 1
+
+def _counting_pool_class(base, counter):
+    """
+    Subclasses a urllib3 connection pool so every new connection (and TLS handshake) is counted.
+    """
+    class CountingPool(base):
+        def _new_conn(self):
+            counter.increment()
+            return super()._new_conn()
+    return CountingPool
+
+class _PooledAdapter(HTTPAdapter):
+    def __init__(self, counter, **kwargs):
+        self._counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self._counter),
+            'https': _counting_pool_class(HTTPSConnectionPool, self._counter),
+        }
+
+class HTTPClient:
+    """
+    Keep-alive HTTP client shared by every outbound ElevenLabs call, so requests reuse
+    open connections instead of paying for a new TCP and TLS handshake each time.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_connections=10):
+        """
+        Args:
+            connect_timeout (float): Seconds allowed to open a connection.
+            read_timeout (float): Seconds allowed between bytes of the response.
+            pool_maxsize (int): Connections kept open per host.
+            pool_connections (int): Number of hosts whose pools are kept.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self._counter = _ConnectionCounter()
+        self._requests = 0
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        # Retries are handled by the caller's RetryPolicy, so the adapter never retries on its own
+        adapter = _PooledAdapter(self._counter, pool_connections=pool_connections,
+                                 pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._requests += 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Requests sent, connections opened and the share of requests that reused an open connection.
+        """
+        with self._lock:
+            sent = self._requests
+        opened = self._counter.opened
+        return {
+            'requests': sent,
+            'connections_opened': opened,
+            'connection_reuse_rate': round(1 - opened / sent, 3) if sent else 0.0,
+        }
+
+    def close(self):
+        self.session.close()
+
+# Client used when a caller does not pass its own
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """
+    Returns the process-wide HTTPClient, creating it with default settings on first use.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
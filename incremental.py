@@ -0,0 +1,88 @@
+# incremental.py
+
+import json
+import os
+
+MANIFEST_FILENAME = 'manifest.json'
+
+def entry_key(entry):
+    """
+    Identifies a line across exports by its entry tag and voice, so each Player voice is tracked separately.
+    """
+    return entry.getTag(), entry.getVoiceID()
+
+def manifest_line(entry):
+    """
+    Describes one line in a job's manifest by its entrytag, voice ID and clean text.
+    """
+    return {
+        'entrytag': entry.getTag(),
+        'voiceID': entry.getVoiceID(),
+        'cleanText': entry.getCleanText(),
+    }
+
+def build_manifest(entries):
+    """
+    Builds the manifest stored with a job, describing every line it produced.
+    Args:
+        entries (iterable): The Entry objects whose audio the job holds.
+    Returns:
+        list: One dictionary per entry, from manifest_line.
+    """
+    return [manifest_line(entry) for entry in entries]
+
+def write_manifest(job_folder, manifest):
+    with open(os.path.join(job_folder, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+def load_manifest(job_folder):
+    """
+    Reads a job's manifest.
+    Returns:
+        list: The manifest, or None if the job has none.
+    """
+    manifest_path = os.path.join(job_folder, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class ManifestDiff:
+    """
+    Compares a new entry set against the manifest of a previous job as the entries stream past.
+    """
+
+    def __init__(self, previous_manifest):
+        self.previous = {(item['entrytag'], item['voiceID']): item['cleanText'] for item in previous_manifest}
+        self.delta = {'added': [], 'changed': [], 'removed': [], 'unchanged': 0}
+        self._seen = set()
+
+    def filter(self, entries):
+        """
+        Yields only the entries that are added or whose text changed, recording each in the delta.
+        """
+        for entry in entries:
+            key = entry_key(entry)
+            self._seen.add(key)
+            line = {'entrytag': key[0], 'voiceID': key[1]}
+            if key not in self.previous:
+                self.delta['added'].append(line)
+                yield entry
+            elif self.previous[key] != entry.getCleanText():
+                self.delta['changed'].append(line)
+                yield entry
+            else:
+                self.delta['unchanged'] += 1
+
+    def finish(self):
+        """
+        Lists the lines of the previous job missing from the new entries. Call once every entry has been filtered.
+        Returns:
+            dict: The delta, listing added, changed and removed lines and the number unchanged.
+        """
+        self.delta['removed'] = [
+            {'entrytag': entrytag, 'voiceID': voice_id}
+            for entrytag, voice_id in self.previous
+            if (entrytag, voice_id) not in self._seen
+        ]
+        return self.delta
@@ -0,0 +1,126 @@
+# ingest.py
+
+import csv
+import gzip
+import io
+import os
+import zipfile
+import zlib
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+def detect_format(stream):
+    """
+    Returns 'gzip', 'zip' or 'csv' for an uploaded file from its first bytes, leaving the stream at its start.
+    """
+    magic = stream.read(4)
+    stream.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if magic == ZIP_MAGIC:
+        return 'zip'
+    return 'csv'
+
+def open_exports(stream, filename):
+    """
+    Yields (name, text stream) for each export in an uploaded file: a CSV, a gzip-compressed CSV or a zip
+    archive of CSVs. Compressed exports are decompressed as they are read.
+    """
+    upload_format = detect_format(stream)
+    if upload_format == 'gzip':
+        yield filename, io.TextIOWrapper(gzip.GzipFile(fileobj=stream), encoding='utf-8', newline='')
+    elif upload_format == 'zip':
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.csv') or info.filename.startswith('__MACOSX/'):
+                    continue
+                with archive.open(info) as member:
+                    yield f"{filename}/{info.filename}", io.TextIOWrapper(member, encoding='utf-8', newline='')
+    else:
+        yield filename, io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+def merge_exports(uploads, output_path, max_bytes=None):
+    """
+    Writes the dialogue entries of one or more uploaded exports into a single export, reading each upload
+    once as it is decompressed. Only the DialogueEntries section, the one the parser reads, is kept. Rows of
+    later exports are mapped onto the first export's columns, and entry tags already seen are skipped, so the
+    merged job synthesizes each line once; where the text differs, the first export's line is kept.
+    Args:
+        uploads (iterable): (filename, binary stream) pairs, as accepted by open_exports.
+        output_path (str): Path of the merged CSV file.
+        max_bytes (int): Optional. Limit on the decompressed size of all exports together.
+    Returns:
+        dict: The number of 'exports' and 'rows' merged, of 'duplicates' skipped and of those, 'conflicts'
+            whose text differed from the line kept.
+    Raises:
+        ValueError: If an export has no dialogue entries or the exports are too large.
+    """
+    stats = {'exports': 0, 'rows': 0, 'duplicates': 0, 'conflicts': 0}
+    size = 0
+    headers = None
+    seen = {}  # Entry tag -> text of the line kept
+
+    def count_size(lines):
+        # Stops a small compressed upload from expanding without bound
+        nonlocal size
+        for line in lines:
+            size += len(line)
+            if max_bytes and size > max_bytes:
+                raise ValueError(f"The uploaded exports are larger than {max_bytes:,} bytes once decompressed.")
+            yield line
+
+    try:
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            for filename, stream in uploads:
+                for name, text in open_exports(stream, filename):
+                    reader = csv.reader(count_size(text))
+                    for row in reader:
+                        if row and row[0] == 'DialogueEntries':
+                            break
+                    else:
+                        raise ValueError(f"{name} has no DialogueEntries section.")
+                    export_headers = [header.strip() for header in next(reader, [])]
+                    column_types = next(reader, [])
+                    if 'entrytag' not in export_headers or 'DialogueText' not in export_headers:
+                        raise ValueError(f"{name} has no entrytag and DialogueText columns.")
+
+                    if headers is None:
+                        headers = export_headers
+                        writer.writerows([['DialogueEntries'], headers, column_types])
+                    positions = None
+                    if export_headers != headers:
+                        positions = [export_headers.index(header) if header in export_headers else None
+                                     for header in headers]
+                    entrytag_index = export_headers.index('entrytag')
+                    text_index = export_headers.index('DialogueText')
+
+                    # The OutgoingLinks section after the entries, and anything after it, is never decompressed
+                    for row in reader:
+                        if not row or row[0] == 'OutgoingLinks':
+                            break
+                        entrytag = row[entrytag_index].strip() if len(row) > entrytag_index else ''
+                        text = row[text_index] if len(row) > text_index else ''
+                        if entrytag and entrytag in seen:
+                            stats['duplicates'] += 1
+                            if seen[entrytag] != text:
+                                stats['conflicts'] += 1
+                            continue
+                        seen[entrytag] = text
+                        if positions is not None:
+                            row = [row[index] if index is not None and index < len(row) else '' for index in positions]
+                        writer.writerow(row)
+                        stats['rows'] += 1
+                    stats['exports'] += 1
+
+            if headers is None:
+                raise ValueError("No dialogue export was uploaded.")
+            writer.writerow(['OutgoingLinks'])
+    except (ValueError, OSError, EOFError, zlib.error, zipfile.BadZipFile, csv.Error) as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if isinstance(e, ValueError) and not isinstance(e, UnicodeDecodeError):
+            raise
+        raise ValueError(f"Could not read the uploaded exports: {e}") from e
+    return stats
@@ -0,0 +1,219 @@
+# janitor.py
+
+import os
+import shutil
+import threading
+import time
+import traceback
+
+from export_index import index_path_for
+from metrics import log_event
+
+# What a completed job keeps besides its manifest: both copies of its audio, only the zip or only the loose files
+RETAIN_OUTPUT = ('both', 'zip', 'loose')
+
+def folder_size(path):
+    """
+    Returns the bytes held by the files under a folder. Files removed while it is walked are skipped.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+def is_within(path, folder):
+    folder = os.path.abspath(folder)
+    return os.path.commonpath([os.path.abspath(path), folder]) == folder
+
+def remove_file(path):
+    """
+    Removes a file if it exists. Returns the bytes freed.
+    """
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except OSError:
+        return 0
+    return size
+
+class Janitor:
+    """
+    Background thread keeping the uploads folder and session store from growing without bound. Each sweep
+    prunes stale sessions, trims completed jobs down to the output they retain, and removes finished jobs
+    past their TTL or, oldest first, while the uploads folder is over its budget.
+    """
+
+    def __init__(self, store, upload_folder, session_dir=None, max_bytes=None, job_ttl=None, session_ttl=None,
+                 retain_output='both', interval=600.0):
+        """
+        Args:
+            store (JobStore): Job records; removed jobs are marked 'expired'.
+            upload_folder (str): Folder holding one folder per job.
+            session_dir (str): Optional. Folder of the filesystem session store.
+            max_bytes (int): Optional. Budget for the uploads folder.
+            job_ttl (float): Optional. Seconds a finished job is kept after it last changed.
+            session_ttl (float): Optional. Seconds a session file is kept after it was last written.
+            retain_output (str): One of RETAIN_OUTPUT. Trimming a job also removes its uploaded export.
+            interval (float): Seconds between sweeps.
+        """
+        if retain_output not in RETAIN_OUTPUT:
+            raise ValueError(f"retain_output must be one of {', '.join(RETAIN_OUTPUT)}.")
+        self.store = store
+        self.upload_folder = upload_folder
+        self.session_dir = session_dir
+        self.max_bytes = max_bytes
+        self.job_ttl = job_ttl
+        self.session_ttl = session_ttl
+        self.retain_output = retain_output
+        self.interval = interval
+        self.usage = {}  # Measured by the last sweep, so reading it is free
+        self._sweep_lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """
+        Starts sweeping in a background thread. Safe to call more than once.
+        """
+        with self._sweep_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name='janitor', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                traceback.print_exc()
+            time.sleep(self.interval)
+
+    def sweep(self):
+        """
+        Runs one pass over the session store and the uploads folder.
+        Returns:
+            dict: Counts of what was removed, and 'bytes_freed'.
+        """
+        with self._sweep_lock:
+            now = time.time()
+            result = {'sessions_removed': 0, 'folders_removed': 0, 'jobs_trimmed': 0, 'jobs_expired': 0,
+                      'bytes_freed': 0}
+            sessions, session_bytes = self._sweep_sessions(now, result)
+
+            os.makedirs(self.upload_folder, exist_ok=True)
+            sizes = {}
+            for name in os.listdir(self.upload_folder):
+                path = os.path.join(self.upload_folder, name)
+                sizes[name] = folder_size(path) if os.path.isdir(path) else os.path.getsize(path)
+
+            # Folders of uploads that were rejected or interrupted before their job was created
+            for name in list(sizes):
+                path = os.path.join(self.upload_folder, name)
+                if self.job_ttl and now - os.path.getmtime(path) > self.job_ttl and self.store.get_job(name) is None:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                    result['folders_removed'] += 1
+                    result['bytes_freed'] += sizes.pop(name)
+
+            jobs = [job for job in self.store.finished_jobs() if job['job_id'] in sizes]
+            if self.retain_output != 'both':
+                for job in jobs:
+                    freed = self.trim_job(job) if job['status'] == 'completed' else 0
+                    if freed:
+                        result['jobs_trimmed'] += 1
+                        result['bytes_freed'] += freed
+                        sizes[job['job_id']] -= freed
+
+            # Jobs are ordered by when they finished, so once one is within the TTL and the budget is met, all are
+            for job in jobs:
+                expired = self.job_ttl and now - job['updated_at'] > self.job_ttl
+                over_budget = self.max_bytes and sum(sizes.values()) > self.max_bytes
+                if not (expired or over_budget):
+                    break
+                shutil.rmtree(os.path.join(self.upload_folder, job['job_id']), ignore_errors=True)
+                self.store.expire_job(job['job_id'])
+                result['jobs_expired'] += 1
+                result['bytes_freed'] += sizes.pop(job['job_id'])
+
+            uploads_bytes = sum(sizes.values())
+            self.usage = {
+                'uploads_bytes': uploads_bytes,
+                'uploads_max_bytes': self.max_bytes,
+                'job_folders': len(sizes),
+                'sessions': sessions,
+                'sessions_bytes': session_bytes,
+                'measured_at': now,
+            }
+            if result['bytes_freed'] or result['sessions_removed']:
+                log_event('janitor_sweep',
+                          f"Freed {result['bytes_freed']} bytes: expired {result['jobs_expired']} job(s), trimmed "
+                          f"{result['jobs_trimmed']}, removed {result['folders_removed']} stray folder(s) and "
+                          f"{result['sessions_removed']} session(s). Uploads now hold {uploads_bytes} bytes.",
+                          uploads_bytes=uploads_bytes, **result)
+            if self.max_bytes and uploads_bytes > self.max_bytes:
+                log_event('uploads_over_budget', f"Uploads hold {uploads_bytes} bytes, over the budget of "
+                          f"{self.max_bytes}, with no finished job left to remove.",
+                          uploads_bytes=uploads_bytes, max_bytes=self.max_bytes)
+            return result
+
+    def _sweep_sessions(self, now, result):
+        """
+        Removes session files not written for session_ttl seconds.
+        Returns:
+            tuple: The number of sessions left and the bytes they hold.
+        """
+        if not self.session_dir or not os.path.isdir(self.session_dir):
+            return 0, 0
+        sessions = 0
+        session_bytes = 0
+        for name in os.listdir(self.session_dir):
+            path = os.path.join(self.session_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.session_ttl and now - stat.st_mtime > self.session_ttl:
+                result['sessions_removed'] += 1
+                result['bytes_freed'] += remove_file(path)
+            else:
+                sessions += 1
+                session_bytes += stat.st_size
+        return sessions, session_bytes
+
+    def trim_job(self, job):
+        """
+        Removes a completed job's uploaded export and whichever copy of its audio is not retained.
+        Returns:
+            int: The bytes freed.
+        """
+        job_folder = os.path.join(self.upload_folder, job['job_id'])
+        zip_file_path = job.get('filename')
+        if not zip_file_path or not os.path.exists(zip_file_path):
+            return 0
+
+        freed = 0
+        if self.retain_output == 'zip':
+            loose_folder = os.path.join(job_folder, f"voice_files_{job['date_stamp']}")
+            if os.path.isdir(loose_folder):
+                freed += folder_size(loose_folder)
+                shutil.rmtree(loose_folder, ignore_errors=True)
+        else:
+            # Without KEEP_LOOSE_FILES a job's lines point into the shared audio cache, which may evict them,
+            # so the zip is only removed while every line has a loose file of its own
+            audio = self.store.get_audio(job['job_id'])
+            if audio and all(is_within(item['path'], job_folder) and os.path.exists(item['path']) for item in audio):
+                freed += remove_file(zip_file_path)
+
+        # The manifest stays, so incremental jobs can still be based on this one
+        for path in (job.get('dialogue_file_path'), job.get('voices_file_path')):
+            if path and is_within(path, job_folder):
+                freed += remove_file(path)
+                if path == job.get('dialogue_file_path'):
+                    freed += remove_file(index_path_for(path))
+        return freed
@@ -0,0 +1,73 @@
+# job_queue.py
+
+import threading
+import traceback
+
+class JobQueue:
+    """
+    Bounded pool of worker threads that take queued jobs from a JobStore one at a time.
+    """
+
+    def __init__(self, store, handler, num_workers=2, poll_interval=5.0, resume_interrupted=True):
+        """
+        Args:
+            store (JobStore): Where jobs are queued and claimed.
+            handler (callable): Called as handler(job) to process a claimed job.
+            num_workers (int): Maximum number of jobs processed at once.
+            poll_interval (float): Seconds an idle worker waits before checking the store again,
+                so jobs queued by other processes are also picked up.
+            resume_interrupted (bool): Requeue jobs left processing when starting. Only one process sharing
+                the store should do this, since jobs another live process is running look the same.
+        """
+        self.store = store
+        self.handler = handler
+        self.num_workers = max(1, int(num_workers))
+        self.poll_interval = poll_interval
+        self.resume_interrupted = resume_interrupted
+        self.active_workers = 0
+        self._threads = []
+        self._condition = threading.Condition()
+        self._started = False
+
+    def start(self):
+        """
+        Requeues jobs interrupted by a restart and starts the workers. Safe to call more than once.
+        """
+        with self._condition:
+            if self._started:
+                return
+            self._started = True
+        if self.resume_interrupted:
+            resumed = self.store.requeue_interrupted()
+            if resumed:
+                print(f"Resuming {resumed} interrupted job(s).")
+        for index in range(self.num_workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        """
+        Wakes an idle worker after a job has been queued.
+        """
+        with self._condition:
+            self._condition.notify()
+
+    def _work(self):
+        while True:
+            job = self.store.claim_next_job()
+            if job is None:
+                with self._condition:
+                    self._condition.wait(self.poll_interval)
+                continue
+
+            with self._condition:
+                self.active_workers += 1
+            try:
+                self.handler(job)
+            except Exception as e:
+                traceback.print_exc()
+                self.store.update_job(job['job_id'], status='failed', error=str(e))
+            finally:
+                with self._condition:
+                    self.active_workers -= 1
@@ -0,0 +1,319 @@
+# job_store.py
+
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    dialogue_file_path TEXT,
+    voices_file_path TEXT,
+    token TEXT,
+    output_format TEXT,
+    date_stamp TEXT,
+    filename TEXT,
+    error TEXT,
+    total_entries INTEGER,
+    cache_hits INTEGER,
+    cache_misses INTEGER,
+    throughput TEXT,
+    failed_entries TEXT,
+    base_job_id TEXT,
+    delta TEXT,
+    progress TEXT,
+    parent_job_id TEXT,
+    shard_index INTEGER,
+    shard_count INTEGER,
+    shard_by TEXT,
+    selection TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+
+CREATE TABLE IF NOT EXISTS job_audio (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    entrytag TEXT NOT NULL,
+    arcname TEXT NOT NULL,
+    path TEXT NOT NULL,
+    UNIQUE (job_id, arcname)
+);
+"""
+
+# Columns added after the first release, with their types, so older databases are upgraded in place
+ADDED_COLUMNS = {
+    'base_job_id': 'TEXT',
+    'delta': 'TEXT',
+    'progress': 'TEXT',
+    'parent_job_id': 'TEXT',
+    'shard_index': 'INTEGER',
+    'shard_count': 'INTEGER',
+    'shard_by': 'TEXT',
+    'selection': 'TEXT',
+}
+
+# Columns holding JSON-encoded values
+JSON_FIELDS = {'throughput', 'failed_entries', 'delta', 'progress'}
+
+# Statuses of jobs that have not finished yet. A sharded job waits in 'sharded' while its shards
+# are processed as jobs of their own, then in 'merging' while their output is combined.
+ACTIVE_STATUSES = ('queued', 'processing', 'sharded', 'merging')
+
+# Finished jobs end 'completed' or 'failed', and become 'expired' once the janitor removes their files
+
+class JobStore:
+    """
+    Durable record of jobs and their finished lines, kept in SQLite so a restart loses nothing.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def create_job(self, job_id, owner, dialogue_file_path, voices_file_path, token, output_format,
+                   base_job_id=None, selection=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, owner, status, created_at, updated_at, dialogue_file_path, "
+                "voices_file_path, token, output_format, base_job_id, selection) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, owner, now, now, dialogue_file_path, voices_file_path, token, output_format, base_job_id,
+                 selection)
+            )
+
+    def create_sharded_job(self, job_id, owner, dialogue_file_path, voices_file_path, token, output_format,
+                           date_stamp, shard_count, shard_by, base_job_id=None, selection=None):
+        """
+        Creates a job split into shard_count shard jobs, <job_id>-<index>, queued for any worker to claim.
+        The job itself is never claimed; it is merged once all of its shards have completed.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, owner, status, created_at, updated_at, dialogue_file_path, "
+                    "voices_file_path, token, output_format, date_stamp, base_job_id, shard_count, shard_by, "
+                    "selection) VALUES (?, ?, 'sharded', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, owner, now, now, dialogue_file_path, voices_file_path, token, output_format, date_stamp,
+                     base_job_id, shard_count, shard_by, selection)
+                )
+                self._conn.executemany(
+                    "INSERT INTO jobs (job_id, owner, status, created_at, updated_at, dialogue_file_path, "
+                    "voices_file_path, token, output_format, date_stamp, base_job_id, parent_job_id, shard_index, "
+                    "shard_count, shard_by, selection) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(f"{job_id}-{index}", owner, now, now, dialogue_file_path, voices_file_path, token, output_format,
+                      date_stamp, base_job_id, job_id, index, shard_count, shard_by, selection)
+                     for index in range(shard_count)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_shards(self, job_id):
+        """
+        Returns the shard jobs of a sharded job, in shard order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE parent_job_id = ? ORDER BY shard_index", (job_id,)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def get_job(self, job_id):
+        """
+        Returns the job as a dictionary, with 'lines_ready' counting its finished lines, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            lines_ready = self._conn.execute(
+                "SELECT COUNT(*) FROM job_audio WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+        job = self._decode(row)
+        job['lines_ready'] = lines_ready
+        return job
+
+    def update_job(self, job_id, **fields):
+        """
+        Sets the given columns on a job. Dictionaries and lists are stored as JSON. A job set 'completed' or
+        'failed' can no longer resume, so its session token, which holds the user's API key, is cleared.
+        """
+        if fields.get('status') in ('completed', 'failed'):
+            fields['token'] = None
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        values = [json.dumps(value) if name in JSON_FIELDS else value for name, value in fields.items()]
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*values, job_id))
+
+    def add_audio(self, job_id, entrytag, arcname, path):
+        """
+        Records a finished line. Re-recording the same arcname replaces the earlier row.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_audio (job_id, entrytag, arcname, path) VALUES (?, ?, ?, ?)",
+                (job_id, entrytag, arcname, path)
+            )
+
+    def get_audio(self, job_id, after_seq=0):
+        """
+        Returns the job's finished lines in completion order, optionally only those after a sequence number.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, entrytag, arcname, path FROM job_audio WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def relocate_audio(self, job_id, old_prefix, new_prefix):
+        """
+        Rewrites the paths of a job's finished lines that start with old_prefix, after their files were moved.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_audio SET path = ? || substr(path, ?) WHERE job_id = ? AND substr(path, 1, ?) = ?",
+                (new_prefix, len(old_prefix) + 1, job_id, len(old_prefix), old_prefix)
+            )
+
+    def find_audio(self, job_id, arcname):
+        """
+        Returns the finished line stored at an arcname, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, entrytag, arcname, path FROM job_audio WHERE job_id = ? AND arcname = ?",
+                (job_id, arcname)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def claim_next_job(self):
+        """
+        Atomically moves the next queued job to 'processing' and returns it, or None if the queue is empty.
+        Owners with the fewest running jobs go first, so one user's uploads cannot starve another's;
+        ties are broken by submission time.
+        A sharded job whose shards have all completed is returned first, moved to 'merging'.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                status = 'merging'
+                row = self._conn.execute(
+                    "SELECT * FROM jobs AS p WHERE p.status = 'sharded' AND NOT EXISTS "
+                    "(SELECT 1 FROM jobs AS s WHERE s.parent_job_id = p.job_id AND s.status != 'completed') "
+                    "ORDER BY p.created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    status = 'processing'
+                    row = self._conn.execute(
+                        "SELECT * FROM jobs AS j WHERE j.status = 'queued' ORDER BY "
+                        "(SELECT COUNT(*) FROM jobs AS r WHERE r.owner = j.owner AND r.status = 'processing'), "
+                        "j.created_at LIMIT 1"
+                    ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                        (status, time.time(), row['job_id'])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = self._decode(row)
+        job['status'] = status
+        return job
+
+    def recent_throughputs(self, limit=20):
+        """
+        Returns the run statistics of the most recently completed jobs, newest first.
+        Shard jobs are left out; the sharded job they belong to carries their combined statistics.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT throughput FROM jobs WHERE status = 'completed' AND throughput IS NOT NULL "
+                "AND parent_job_id IS NULL ORDER BY updated_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [json.loads(row['throughput']) for row in rows]
+
+    def requeue_interrupted(self):
+        """
+        Returns jobs left 'processing' by a previous run to the queue so they resume,
+        and sharded jobs left 'merging' to 'sharded' so they are merged again.
+        Returns:
+            int: The number of jobs requeued.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'processing'",
+                (time.time(),)
+            )
+            merges = self._conn.execute(
+                "UPDATE jobs SET status = 'sharded', updated_at = ? WHERE status = 'merging'",
+                (time.time(),)
+            )
+        return cursor.rowcount + merges.rowcount
+
+    def finished_jobs(self):
+        """
+        Returns finished jobs whose files are still kept, least recently updated first. Shard jobs are left out,
+        since their output belongs to their sharded job, as are jobs an unfinished incremental job is based on.
+        """
+        placeholders = ', '.join('?' * len(ACTIVE_STATUSES))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status NOT IN ({placeholders}) AND status != 'expired' "
+                f"AND parent_job_id IS NULL AND job_id NOT IN (SELECT base_job_id FROM jobs "
+                f"WHERE base_job_id IS NOT NULL AND status IN ({placeholders})) ORDER BY updated_at",
+                (*ACTIVE_STATUSES, *ACTIVE_STATUSES)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def expire_job(self, job_id):
+        """
+        Marks a job whose files were removed as 'expired' and forgets its finished lines and session token.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'expired', filename = NULL, token = NULL, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+            self._conn.execute("DELETE FROM job_audio WHERE job_id = ?", (job_id,))
+
+    def count_jobs(self, status):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def _migrate(self):
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+        # Jobs finished before tokens were cleared on finishing
+        self._conn.execute("UPDATE jobs SET token = NULL WHERE status IN ('completed', 'failed', 'expired') "
+                           "AND token IS NOT NULL")
+
+    def _decode(self, row):
+        job = dict(row)
+        for name in JSON_FIELDS:
+            if job.get(name) is not None:
+                job[name] = json.loads(job[name])
+        return job
@@ -0,0 +1,211 @@
+# metrics.py
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 'json' prints one JSON object per log line for log collectors; 'text' keeps plain messages
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+
+# Histogram bucket upper bounds in seconds, from parsing a single row (tens of microseconds) to a slow API request
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """
+    Monotonically increasing count, optionally split by labels.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Gauge:
+    """
+    Value read when metrics are collected, from a callable returning a number.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def samples(self):
+        yield f"{self.name} {_format_value(self.read())}"
+
+class Histogram:
+    """
+    Distribution of observed durations in cumulative buckets, optionally split by labels.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}  # Label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the with-block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(value) for key, value in self._values.items()}
+        for key, value in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(value[-2])}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {value[-1]}"
+
+def time_iterable(iterable, stage):
+    """
+    Yields the items of an iterable, observing the time taken to produce each one under a pipeline stage.
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        yield item
+
+class BatchTimer:
+    """
+    Adds up the durations of many short operations, such as cleaning one line, and adds them to a pair of
+    counters once per batch, so timing an operation costs two clock reads rather than a locked metric update.
+    """
+
+    def __init__(self, seconds_counter, count_counter, batch_size=1000):
+        self.seconds_counter = seconds_counter
+        self.count_counter = count_counter
+        self.batch_size = batch_size
+        self.seconds = 0.0
+        self.count = 0
+
+    def add(self, seconds):
+        self.seconds += seconds
+        self.count += 1
+        if self.count >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            self.seconds_counter.inc(self.seconds)
+            self.count_counter.inc(self.count)
+            self.seconds = 0.0
+            self.count = 0
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# Pipeline metrics shared by the parser, the synthesis engine and the app
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'tts_stage_seconds', "Time spent per line in each pipeline stage (parse, api, disk_write, zip).",
+    ['stage']))
+CLEAN_SECONDS = REGISTRY.register(Counter(
+    'tts_clean_seconds_total', "Seconds spent cleaning dialogue text, added once per batch of lines."))
+LINES_CLEANED = REGISTRY.register(Counter(
+    'tts_lines_cleaned_total', "Dialogue lines cleaned, added once per batch of lines."))
+API_RESPONSES = REGISTRY.register(Counter(
+    'tts_api_responses_total', "Text-to-speech API responses by HTTP status code ('error' for connection failures).",
+    ['status']))
+CHARACTERS_SYNTHESIZED = REGISTRY.register(Counter(
+    'tts_characters_synthesized_total', "Characters of clean text sent to the API and synthesized successfully."))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'tts_cache_lookups_total', "Lines looked up before synthesis, by result (hit, miss or deduplicated).",
+    ['result']))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    'tts_jobs_finished_total', "Jobs that stopped processing, by final status.", ['status']))
+
+def log_event(event, message, **fields):
+    """
+    Logs one event, as its plain message or, with LOG_FORMAT=json, as a JSON object
+    holding the event name, message and fields.
+    """
+    if LOG_FORMAT == 'json':
+        line = json.dumps(dict(fields, event=event, message=message, time=round(time.time(), 3)), default=str)
+    else:
+        line = message
+    # One write per line, so lines logged from several threads do not interleave
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
@@ -1,47 +1,20 @@
 import csv
-import re
+import os
 import json
-from Entry import Entry
+import time
+from Entry import Entry, DialogueText
+from text_cleaner import TextCleaner, load_cleaning_rules, DEFAULT_RULES_PATH
+from metrics import CLEAN_SECONDS, LINES_CLEANED, BatchTimer, log_event
 from datetime import datetime
 
-# List of items to remove from entries.
-remove_items = [
-    "[em1]", "[/em1]", "[em2]", "[/em2]", "[em3]", "[/em3]", "[em4]", "[/em4]",
-    "[em5]", "[/em5]", "[em6]", "[/em6]", "\\r", "[/r]", "[/n]", "\\n",
-    "<joke>", "[var=classifierFeedback]", "...", "{{PLACEHOLDER - CLOSE MAP}}",
-    "{{PLACEHOLDER - OPEN MAP MENU}}", "{{PLACEHOLDER - MAP OPENS, MAP TUTORIAL 2 PLAYS}}",
-    "{{PLACEHOLDER - ARGUMENTATION INTERFACE OPENS}}", "{{PLACEHOLDER - DRONE CONTROL TUTORIAL}}",
-    "{{PLACEHOLDER - DATA TABLE POP-UP}}", "{{PLACEHOLDER - TOPOGRAPHY VIDEO}}",
-    "{{PLACEHOLDER - U1 TOPOGRAPHY LESSON PLAYS}}", "{{PLACEHOLDER - WATERSHED TOPPO LESSON}}",
-    "{{PLACEHOLDER - WATERSHED TOPPO LESSON PLAYS}}", "{{PLACEHOLDER - FORGE MINI GAME}}",
-    "{{PLACEHOLDER - MAP OPENS AUTOMATICALLY}}", "{{PLACEHOLDER - MAP OPENS}}",
-    "{{PLACEHOLDER - ARGUMENTATION}}", "{{PLACEHOLDER - TRANSITION TO BASE CAMP}}",
-    "{{PLACEHOLDER - CLASSIFICATION EXERCISE AND FEEDBACK}}", "{{PLACEHOLDER - LAUNCH DRONE}}",
-    "{{PLACEHOLDER - DANI MENU ACTIVATION ANIMATION}}", "{{PLACEHOLDER - MENU OPENS AUTOMATICALLY}}",
-    "{{PLACEHOLDER - PLAYER CLOSES MENU}}", "{{PLACEHOLDER - TOPOGRAPHY LESSON PLAYS}}",
-    "{{PLACEHOLDER - ARGUMENTATION TOPPO LESSON PLAYS}}",
-    "{{PLACEHOLDER - SHIP SHAKES VIOLENTLY, DISTANT EXPLOSION}}",
-    "{{PLACEHOLDER - OPEN ARGUMENTATION INTERFACE}}", "[[PLACEHOLDER - Argument]]",
-    "[[PLACEHOLDER - Skipping the facility because it isn't in the scene yet]]", "[nosubtitle]",
-    "<color=#35F>", "<color=#F53>", "*", '"', '"', "(brightly)", "(getting excited)", "…", "“",
-    "”", "(muttering to herself)", "</color>", "[[Placeholder - Character Customization]]",
-    "{{PLACEHOLDER- DANI MENU ACTIVATION ANIMATION}}", "{{PLACEHOLDER - PLAYER CLOSES MENU}",
-    "[In ear]",
-    "[links to toppo lesson]",
-]
-
-# Dictionary of items to replace 
-replace_items = {
-    "’": "'",
-    "–": " ",
-    "-": " ",
-    "—": " ",
-    "TK": "Tea Kay",
-    "C c c": "Kah, kah, kah",
-    "WAT247": "Watt 2 4 7",
-    "Mission HydroSci": "Mission Hydro Sci",
-    "Mission Hydrosci": "Mission Hydro Sci",
-}
+# Items to remove, items to replace and patterns to strip are read from
+# cleaning_rules.json (or the file named by CLEANING_RULES_PATH).
+cleaning_rules = load_cleaning_rules(os.environ.get('CLEANING_RULES_PATH', DEFAULT_RULES_PATH))
+remove_items = cleaning_rules['remove']
+replace_items = cleaning_rules['replace']
+
+# Compiled once and reused for every line
+text_cleaner = TextCleaner(remove_items, replace_items, cleaning_rules['remove_patterns'])
 
 # Get the current date in YYYYMMDD format
 current_date = datetime.now().strftime('%Y%m%d')
@@ -97,40 +70,28 @@ def clean_dialogue_text(dialogueText):
     Arg: dialogueText (str)
     Returns: The cleaned dialogue text.
     """
-    if not dialogueText:
-        return ''
-
-    # Remove unwanted items
-    for item in remove_items:
-        dialogueText = dialogueText.replace(item, '')
-
-    # Replace specified items
-    for old, new in replace_items.items():
-        dialogueText = dialogueText.replace(old, new)
-
-    # Use regex to remove any remaining placeholders or tags, and any text within double braces {{}}, double brackets [[]], or angle brackets <>
-    dialogueText = re.sub(r'\{\{.*?\}\}', '', dialogueText)   # {{...}}
-    dialogueText = re.sub(r'\[\[.*?\]\]', '', dialogueText)   # [[...]]
-    dialogueText = re.sub(r'<.*?>', '', dialogueText)         # <...>
-    dialogueText = re.sub(r'\\[rn]', '', dialogueText)        # \r and \n
-    dialogueText = re.sub(r'\.\.\.', '', dialogueText)        # ...
-    dialogueText = re.sub(r'“', '"', dialogueText)            # Replaces fancy quotes with standard quotes
-    dialogueText = re.sub(r'”', '"', dialogueText)
-
-    # Normalize whitespace
-    dialogueText = ' '.join(dialogueText.split())
+    return text_cleaner.clean(dialogueText)
 
-    # Strip leading and trailing whitespace
-    dialogueText = dialogueText.strip()
-
-    return dialogueText
+def clean_timer():
+    """
+    Returns a timer for the cleaning done while reading one export; flush it once the export has been read.
+    """
+    return BatchTimer(CLEAN_SECONDS, LINES_CLEANED)
 
-def parse_dialogue_csv(csv_file, voices_file):
+def iter_dialogue_csv(csv_file, voices_file, warn=True):
+    """
+    Reads a Dialogue System export in one pass, yielding entries as their rows are read
+    so synthesis can start on the first line and memory stays flat on large exports.
+    Args:
+        csv_file (str): Path to the exported CSV file.
+        voices_file (str): Path to the VoiceAssignments.json file.
+        warn (bool): Log lines whose character has no voice assignment.
+    Yields:
+        Entry: One entry per line with text, or one per Player voice for Player lines.
+    """
     # Read voice assignments
     voice_data = read_voices(voices_file)
 
-    entries = []
-
     with open(csv_file, 'r', encoding='utf-8') as f:
         reader = csv.reader(f)
 
@@ -140,76 +101,132 @@ def parse_dialogue_csv(csv_file, voices_file):
                 break
 
         # Read the next header row to get column names
-        headers = next(reader, None)
-        if headers is None:
-            print("Error: Could not find header row after 'DialogueEntries' section.")
-            return []
+        columns = find_dialogue_columns(next(reader, None))
+        if columns is None:
+            return
 
-        # Strip whitespace from headers
-        headers = [header.strip() for header in headers]
+        # Skip the column type row
+        next(reader, None)
 
-        # Create a mapping from header names to indices
-        header_indices = {header: index for index, header in enumerate(headers)}
+        # Iterate over the dialogue entries; the OutgoingLinks section after them is never read
+        timer = clean_timer()
+        try:
+            for row in reader:
+                if not row or row[0] == 'OutgoingLinks':
+                    break
+                yield from entries_for_row(row, columns, voice_data, warn, timer)
+        finally:
+            timer.flush()
+
+def find_dialogue_columns(headers):
+    """
+    Locates the columns read from the DialogueEntries header row.
+    Returns:
+        tuple: (entrytag index, DialogueText index), or None if either column is missing.
+    """
+    if headers is None:
+        print("Error: Could not find header row after 'DialogueEntries' section.")
+        return None
 
-        # Get the indices for 'entrytag' and 'DialogueText'
-        entrytag_index = header_indices.get('entrytag')
-        dialogue_text_index = header_indices.get('DialogueText')
+    # Strip whitespace from headers
+    headers = [header.strip() for header in headers]
 
-        if entrytag_index is None or dialogue_text_index is None:
-            print("Error: Required columns 'entrytag' or 'DialogueText' not found in CSV headers.")
-            print(f"Available headers: {headers}")
-            return []
+    # Create a mapping from header names to indices
+    header_indices = {header: index for index, header in enumerate(headers)}
 
-        # Remove or comment out the extra row skip if not necessary
-        next(reader, None)
+    # Get the indices for 'entrytag' and 'DialogueText'
+    entrytag_index = header_indices.get('entrytag')
+    dialogue_text_index = header_indices.get('DialogueText')
 
-        # Iterate over the dialogue entries
-        for row in reader:
-            if not row or row[0] == 'OutgoingLinks':
-                break
-            entrytag = row[entrytag_index].strip()
-            dialogue_text = row[dialogue_text_index].strip() if len(row) > dialogue_text_index else ''
-
-            cleaned_text = clean_dialogue_text(dialogue_text)
-
-            # Skip entries with empty cleaned dialogue text
-            if not cleaned_text.strip():
-                continue
-
-            # Extract character name from entrytag
-            character_name = extract_character_name(entrytag)
-
-            # Get character data from voice_data
-            character_info = voice_data.get(character_name)
-
-            if character_info:
-                if character_name == 'Player':
-                    # For 'Player', character_info is a list of voices
-                    for char in character_info:
-                        # Build the entry with all data
-                        entry = Entry(
-                            entrytag=entrytag,
-                            voiceID=char.get('Voice ID'),
-                            voiceName=char.get('Voice Name'),
-                            rawText=dialogue_text
-                        )
-                        entry.setCleanText(cleaned_text)
-                        entries.append(entry)
-                else:
-                    # Build the entry with all data
-                    entry = Entry(
-                        entrytag=entrytag,
-                        voiceID=character_info.get('Voice ID'),
-                        voiceName=character_info.get('Voice Name'),
-                        rawText=dialogue_text
-                    )
-                    entry.setCleanText(cleaned_text)
-                    entries.append(entry)
-            else:
-                # If character not found, print a warning
-                print(f"Warning: Character '{character_name}' not found in voice assignments.")
-
-    return entries
+    if entrytag_index is None or dialogue_text_index is None:
+        print("Error: Required columns 'entrytag' or 'DialogueText' not found in CSV headers.")
+        print(f"Available headers: {headers}")
+        return None
+    return entrytag_index, dialogue_text_index
+
+def entries_for_row(row, columns, voice_data, warn=True, timer=None):
+    """
+    Yields the entries for one DialogueEntries row: none if its text cleans to nothing or its
+    character has no voice, one per Player voice for Player lines, and one otherwise.
+    Args:
+        row (list): The CSV row.
+        columns (tuple): The column indices from find_dialogue_columns.
+        voice_data (dict): The voice assignments from read_voices.
+        warn (bool): Log the line if its character has no voice assignment.
+        timer (BatchTimer): Optional. From clean_timer; the time spent cleaning the line is added to it.
+    """
+    entrytag_index, dialogue_text_index = columns
+    entrytag = row[entrytag_index].strip()
+    dialogue_text = row[dialogue_text_index].strip() if len(row) > dialogue_text_index else ''
+
+    if timer is None:
+        cleaned_text = clean_dialogue_text(dialogue_text)
+    else:
+        start = time.perf_counter()
+        cleaned_text = clean_dialogue_text(dialogue_text)
+        timer.add(time.perf_counter() - start)
+
+    # Skip entries with empty cleaned dialogue text
+    if not cleaned_text.strip():
+        return
+
+    # Extract character name from entrytag
+    character_name = extract_character_name(entrytag)
+
+    # Get character data from voice_data
+    character_info = voice_data.get(character_name)
+
+    if character_info:
+        # One text record per line, shared by every voice that speaks it
+        text = DialogueText(dialogue_text, cleaned_text)
+        if character_name == 'Player':
+            # For 'Player', character_info is a list of voices
+            for char in character_info:
+                # Build the entry with all data
+                yield Entry(
+                    entrytag=entrytag,
+                    voiceID=char.get('Voice ID'),
+                    voiceName=char.get('Voice Name'),
+                    text=text
+                )
+        else:
+            # Build the entry with all data
+            yield Entry(
+                entrytag=entrytag,
+                voiceID=character_info.get('Voice ID'),
+                voiceName=character_info.get('Voice Name'),
+                text=text
+            )
+    elif warn:
+        # If character not found, print a warning
+        log_event('character_missing', f"Warning: Character '{character_name}' not found in voice assignments.",
+                  entrytag=entrytag, character=character_name)
+
+def parse_dialogue_csv(csv_file, voices_file):
+    """
+    Reads every entry of a Dialogue System export into a list.
+    See iter_dialogue_csv for a streaming alternative.
+    """
+    return list(iter_dialogue_csv(csv_file, voices_file))
+
+def get_assigned_voice_ids(voices_file):
+    """
+    Returns every voice ID in the assignments, mapped to the names of the characters it is assigned to.
+    """
+    assigned = {}
+    for name, data in read_voices(voices_file).items():
+        for char in (data if name == 'Player' else [data]):
+            voice_id = char.get('Voice ID')
+            if voice_id:
+                assigned.setdefault(voice_id, []).append(name)
+    return assigned
+
+def get_player_voice_ids(voices_file):
+    """
+    Returns the voice IDs assigned to the Player, which each get their own output folder.
+    """
+    voice_data = read_voices(voices_file)
+    return [char.get('Voice ID') for char in voice_data.get('Player', []) if char.get('Voice ID') is not None]
 """
 
 # TESTING
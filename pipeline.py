@@ -0,0 +1,196 @@
+# pipeline.py
+
+import itertools
+import json
+import os
+
+from parsing_functions import get_player_voice_ids
+from export_index import iter_export, load_index, filter_manifest
+from synthesis import build_player_folders, get_output_path
+from archive import StreamingZipWriter
+from audio_post import pcm_to_wav
+from incremental import manifest_line, write_manifest, ManifestDiff
+from metrics import STAGE_SECONDS, log_event, time_iterable
+from sharding import shard_of
+
+def run_export(engine, dialogue_file_path, voices_file_path, job_folder, date_stamp, job_id,
+               keep_loose_files=True, previous_manifest=None, base_job_id=None, completed_audio=(), limit=None,
+               selection=None, shard=None, postprocessor=None, on_line=None, on_total=None, on_progress=None,
+               progress_interval=1.0):
+    """
+    Synthesizes one dialogue export into a job folder: a zip archive assembled as lines arrive,
+    optional loose files and the manifest used by incremental jobs. Shared by the web app's
+    job workers and the command-line runner.
+    Args:
+        engine (SynthesisEngine): The engine to synthesize with. Its cache holds the audio when
+            loose files are not kept.
+        dialogue_file_path (str): Path to the exported CSV file.
+        voices_file_path (str): Path to the VoiceAssignments.json file.
+        job_folder (str): Folder receiving voice_files_<date_stamp>.zip, the loose files and manifest.json.
+        date_stamp (str): Stamp used in file names.
+        job_id (str): Names the job in log messages.
+        keep_loose_files (bool): Also write each line as a file outside the zip.
+        previous_manifest (list): Optional. Manifest of an earlier job; only lines added or changed
+            since then are synthesized, and the zip carries a delta.json.
+        base_job_id (str): Optional. The earlier job, recorded in delta.json.
+        completed_audio (iterable): (arcname, file_path) pairs finished by an interrupted run, which are
+            carried into the archive and not synthesized again.
+        limit (int): Optional. Maximum number of entries to read from the export.
+        selection (dict): Optional. A filter from export_index.parse_filter; only the rows it selects are read,
+            using the export's index, and the previous manifest is narrowed to match.
+        shard (tuple): Optional. (shard_by, shard_index, shard_count) to synthesize only the entries of one
+            shard, as assigned by sharding.shard_of; the previous manifest is narrowed to the same shard.
+        postprocessor (AudioPostProcessor): Optional. For WAV output, trims and normalizes each line in its
+            process pool while synthesis continues; without it the raw PCM is only wrapped as WAV.
+        on_line (callable): Called as on_line(entry, arcname, file_path) for each finished line.
+        on_total (callable): Called as on_total(count) with the number of lines to synthesize, before synthesis starts.
+        on_progress (callable): Passed to SynthesisEngine.run along with progress_interval.
+    Returns:
+        dict: 'zip_file_path', 'stats' (the engine's run statistics), 'failed_entries' and 'delta' (None for full jobs).
+    """
+    if not keep_loose_files and engine.cache is None:
+        raise ValueError("An engine with an audio cache is required when loose files are not kept.")
+    output_format = engine.output_format
+    wav_output = output_format == 'wav'
+
+    # Base output directory
+    output_base_dir = os.path.join(job_folder, f"voice_files_{date_stamp}")
+    os.makedirs(job_folder, exist_ok=True)
+    if keep_loose_files:
+        os.makedirs(output_base_dir, exist_ok=True)
+
+    # Character-specific folders, created when their first line is written
+    player_folders = build_player_folders(get_player_voice_ids(voices_file_path), output_base_dir, create_dirs=False)
+
+    # The zip file is assembled as each line arrives rather than after the job
+    zip_file_path = os.path.join(job_folder, f'voice_files_{date_stamp}.zip')
+    archive = StreamingZipWriter(zip_file_path)
+
+    def arcname_for(entry):
+        audio_file_path = get_output_path(entry, output_base_dir, player_folders, date_stamp, output_format)
+        return audio_file_path, os.path.relpath(audio_file_path, output_base_dir).replace(os.sep, '/')
+
+    def write_audio(audio, entry):
+        audio_file_path, arcname = arcname_for(entry)
+        with STAGE_SECONDS.time(stage='zip'):
+            archive.add_bytes(arcname, audio)
+        if keep_loose_files:
+            with STAGE_SECONDS.time(stage='disk_write'):
+                os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
+                with open(audio_file_path, 'wb') as f:
+                    f.write(audio)
+        elif wav_output:
+            # The cache holds the raw PCM, so the finished WAV is kept next to it
+            audio_file_path = engine.cache.put(engine.cache_key(entry), output_format, audio)
+        else:
+            # The engine has already stored the line in the audio cache
+            audio_file_path = engine.cache.path_for(engine.cache_key(entry), output_format)
+        if on_line is not None:
+            on_line(entry, arcname, audio_file_path)
+
+    def save_audio(entry, audio):
+        if not wav_output:
+            write_audio(audio, entry)
+        elif postprocessor is not None:
+            # Written once its worker process is done, while synthesis carries on
+            postprocessor.submit(audio, write_audio, entry)
+        else:
+            write_audio(pcm_to_wav(audio), entry)
+
+    def link_cached_audio(entry, cached_path):
+        if wav_output:
+            # Cached lines are raw PCM and go through the same conversion as new ones
+            with open(cached_path, 'rb') as f:
+                save_audio(entry, f.read())
+            return
+        audio_file_path, arcname = arcname_for(entry)
+        with STAGE_SECONDS.time(stage='zip'):
+            archive.add_file(cached_path, arcname)
+        if keep_loose_files:
+            with STAGE_SECONDS.time(stage='disk_write'):
+                os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
+                engine.cache.copy_to(cached_path, audio_file_path)
+        else:
+            audio_file_path = cached_path
+        if on_line is not None:
+            on_line(entry, arcname, audio_file_path)
+
+    # Entries are parsed as the engine consumes them, so the first request goes out
+    # as soon as the first row is read. Each stage below is a generator.
+    manifest = []
+
+    def track_manifest(entries):
+        for entry in entries:
+            manifest.append(manifest_line(entry))
+            yield entry
+
+    if selection is not None and previous_manifest is not None:
+        previous_manifest = filter_manifest(previous_manifest, load_index(dialogue_file_path), selection)
+    if shard is not None and previous_manifest is not None:
+        shard_by, shard_index, shard_count = shard
+        previous_manifest = [line for line in previous_manifest
+                             if shard_of(line['entrytag'], shard_by, shard_count) == shard_index]
+
+    def read_entries(warn=True):
+        entries = iter_export(dialogue_file_path, voices_file_path, selection, warn=warn)
+        if limit:
+            entries = itertools.islice(entries, limit)
+        if shard is not None:
+            shard_by, shard_index, shard_count = shard
+            entries = (entry for entry in entries if shard_of(entry.getTag(), shard_by, shard_count) == shard_index)
+        return entries
+
+    if on_total is not None:
+        # Counted in a pass of its own, so progress has a total and an ETA from the first line.
+        # Parsing is cheap next to synthesis; the same filters and diff are applied as below.
+        counted = read_entries(warn=False)
+        if previous_manifest is not None:
+            counted = ManifestDiff(previous_manifest).filter(counted)
+        on_total(sum(1 for _ in counted))
+
+    to_synthesize = track_manifest(time_iterable(read_entries(), stage='parse'))
+    diff = None
+    if previous_manifest is not None:
+        diff = ManifestDiff(previous_manifest)
+        to_synthesize = diff.filter(to_synthesize)
+
+    with archive:
+        # When resuming, carry lines finished before the interruption into the new archive
+        completed = set()
+        for arcname, file_path in completed_audio:
+            if os.path.exists(file_path):
+                archive.add_file(file_path, arcname)
+                completed.add(arcname)
+        if completed:
+            log_event('job_resumed', f"Resuming job_id {job_id} with {len(completed)} lines already synthesized.",
+                      job_id=job_id, lines_ready=len(completed))
+            to_synthesize = (entry for entry in to_synthesize if arcname_for(entry)[1] not in completed)
+
+        stats = engine.run(to_synthesize, save_audio, on_cached=link_cached_audio,
+                           on_progress=on_progress, progress_interval=progress_interval)
+        failed_entries = stats.pop('failed_entries')
+        if postprocessor is not None:
+            postprocessor.collect(wait_all=True)
+            stats['postprocess_wait_seconds'] = round(postprocessor.wait_seconds, 3)
+
+        # A delta zip carries the list of added, changed and removed lines alongside the audio
+        delta = None
+        if diff is not None:
+            delta = diff.finish()
+            log_event('job_delta', f"Incremental job_id {job_id}: {len(delta['added'])} added, {len(delta['changed'])} changed, "
+                      f"{len(delta['removed'])} removed, {delta['unchanged']} unchanged since job_id {base_job_id}.",
+                      job_id=job_id, base_job_id=base_job_id, added=len(delta['added']), changed=len(delta['changed']),
+                      removed=len(delta['removed']), unchanged=delta['unchanged'])
+            archive.add_bytes('delta.json', json.dumps(dict(delta, base_job_id=base_job_id), indent=1))
+
+    # The manifest covers every line this job's output represents, so the next export can be diffed against it.
+    # Failed lines are left out so an incremental job picks them up again.
+    failed_keys = {(failed['entrytag'], failed['voiceID']) for failed in failed_entries}
+    write_manifest(job_folder, [line for line in manifest if (line['entrytag'], line['voiceID']) not in failed_keys])
+    log_event('job_synthesized',
+              f"Synthesized {stats['succeeded']} lines in {stats['elapsed_seconds']}s ({stats['lines_per_second']} lines/sec) for job_id {job_id}. "
+              f"Reused audio for {stats['deduplicated']} repeated line(s); opened {stats['connections_opened']} connection(s), "
+              f"{stats['connection_reuse_rate']:.0%} of requests reused one.",
+              job_id=job_id, **stats)
+
+    return {'zip_file_path': zip_file_path, 'stats': stats, 'failed_entries': failed_entries, 'delta': delta}
@@ -0,0 +1,88 @@
+# planner.py
+
+import itertools
+import statistics
+
+from export_index import iter_export, load_index, filter_manifest
+from incremental import ManifestDiff
+
+# Recent jobs with fewer API calls than this say little about throughput
+MIN_MEASURED_CALLS = 20
+
+def measured_calls_per_second(throughputs):
+    """
+    Estimates API calls per second from the run statistics of recent jobs.
+    Args:
+        throughputs (list): The 'throughput' statistics stored on completed jobs.
+    Returns:
+        float: The median rate over jobs that made enough calls to measure, or None if there are none.
+    """
+    rates = [
+        stats['submitted'] / stats['elapsed_seconds']
+        for stats in throughputs
+        if stats and stats.get('submitted', 0) >= MIN_MEASURED_CALLS and stats.get('elapsed_seconds')
+    ]
+    return statistics.median(rates) if rates else None
+
+def plan_export(engine, dialogue_file_path, voices_file_path, previous_manifest=None, limit=None,
+                selection=None, calls_per_second=None):
+    """
+    Estimates what synthesizing an export would cost before any request is made: the characters
+    per voice, the API calls left after repeated lines are deduplicated and cached lines reused,
+    and how long those calls should take.
+    Args:
+        engine (SynthesisEngine): The engine the job would run with. Only its cache keys and audio cache
+            are used.
+        dialogue_file_path (str): Path to the exported CSV file.
+        voices_file_path (str): Path to the VoiceAssignments.json file.
+        previous_manifest (list): Optional. Manifest of an earlier job; only lines added or changed
+            since then are counted, as in an incremental job.
+        limit (int): Optional. Maximum number of entries read from the export.
+        selection (dict): Optional. A filter from export_index.parse_filter, planning only the lines it selects.
+        calls_per_second (float): Optional. Throughput used for the wall-time estimate.
+    Returns:
+        dict: 'entries', 'characters', 'voices' (per voice counts, most characters first), 'unique_calls',
+            'deduplicated', 'expected_cache_hits', 'api_calls', 'billable_characters' and 'estimated_seconds'
+            (None without a throughput).
+    """
+    entries = iter_export(dialogue_file_path, voices_file_path, selection)
+    if limit:
+        entries = itertools.islice(entries, limit)
+    if previous_manifest is not None:
+        if selection is not None:
+            previous_manifest = filter_manifest(previous_manifest, load_index(dialogue_file_path), selection)
+        entries = ManifestDiff(previous_manifest).filter(entries)
+
+    voices = {}
+    seen_keys = set()
+    plan = {'entries': 0, 'characters': 0, 'unique_calls': 0, 'expected_cache_hits': 0, 'api_calls': 0,
+            'billable_characters': 0}
+    for entry in entries:
+        characters = len(entry.getCleanText())
+        voice = voices.get(entry.getVoiceID())
+        if voice is None:
+            voice = voices[entry.getVoiceID()] = {'voice_id': entry.getVoiceID(), 'voice_name': entry.getVoiceName(),
+                                                  'lines': 0, 'characters': 0, 'billable_characters': 0}
+        voice['lines'] += 1
+        voice['characters'] += characters
+        plan['entries'] += 1
+        plan['characters'] += characters
+
+        # Repeated lines are synthesized once per job, and cached lines not at all
+        key = engine.cache_key(entry)
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        plan['unique_calls'] += 1
+        if engine.cache is not None and engine.cache.contains(key, engine.cache_format):
+            plan['expected_cache_hits'] += 1
+            continue
+        plan['api_calls'] += 1
+        plan['billable_characters'] += characters
+        voice['billable_characters'] += characters
+
+    plan['deduplicated'] = plan['entries'] - plan['unique_calls']
+    plan['voices'] = sorted(voices.values(), key=lambda voice: voice['characters'], reverse=True)
+    plan['calls_per_second'] = round(calls_per_second, 2) if calls_per_second else None
+    plan['estimated_seconds'] = round(plan['api_calls'] / calls_per_second, 1) if calls_per_second else None
+    return plan
@@ -0,0 +1,108 @@
+# rate_limit.py
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header given either as seconds or as an HTTP date.
+    Args:
+        value (str): The header value, or None.
+    Returns:
+        float: Seconds to wait, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed text-to-speech request is retried.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, status_code, attempt):
+        """
+        Args:
+            status_code (int): The response status, or None for a connection error.
+            attempt (int): Zero-based number of the attempt that just failed.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        return status_code is None or status_code in RETRY_STATUS_CODES
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns the seconds to wait before the next attempt. A Retry-After value
+        from the server takes precedence; otherwise exponential backoff with full jitter is used.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class AdaptiveLimiter:
+    """
+    Bounds in-flight requests for one API key and adapts the bound to rate limiting.
+    The limit is halved when a 429 is seen and grows by one after a full
+    window of successes, never exceeding max_limit.
+    """
+
+    def __init__(self, max_limit, cooldown=1.0):
+        self.max_limit = max(1, int(max_limit))
+        self.limit = self.max_limit
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+        return False
+
+    def record_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify()
+
+    def record_throttle(self):
+        with self._condition:
+            now = time.monotonic()
+            # A burst of 429s from requests already in flight counts as one signal
+            if now - self._last_decrease < self.cooldown:
+                return
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self._last_decrease = now
@@ -0,0 +1,98 @@
+# sharding.py
+
+import json
+import os
+import shutil
+import zlib
+from zipfile import ZipFile
+
+from archive import StreamingZipWriter
+from incremental import load_manifest, write_manifest
+from parsing_functions import extract_character_name
+
+# Ways an export can be split; conversations usually balance better, since the Player speaks most lines
+SHARD_BY = ('conversation', 'character')
+
+# Counts summed across shards when their statistics are combined
+SUMMED_STATS = ('submitted', 'succeeded', 'failed', 'skipped', 'cache_hits', 'cache_misses', 'deduplicated',
+                'retries', 'rate_limited', 'connections_opened', 'postprocess_wait_seconds')
+
+def shard_of(entrytag, shard_by, shard_count):
+    """
+    Returns the shard an entry belongs to. Entry tags are <conversation>_<character>_<id>, so every line of a
+    conversation (or of a character) lands in the same shard, in every process that computes it.
+    """
+    if shard_by == 'conversation':
+        key = entrytag.split('_', 1)[0]
+    else:
+        key = extract_character_name(entrytag)
+    return zlib.crc32(key.encode('utf-8')) % shard_count
+
+def shard_folder(job_folder, shard_index):
+    return os.path.join(job_folder, f"shard_{shard_index}")
+
+def merge_stats(shard_stats, elapsed_seconds):
+    """
+    Combines the run statistics of several shards that ran side by side for elapsed_seconds.
+    """
+    stats = {name: sum(item.get(name, 0) for item in shard_stats) for name in SUMMED_STATS}
+    stats['elapsed_seconds'] = round(elapsed_seconds, 3)
+    stats['lines_per_second'] = round(stats['succeeded'] / elapsed_seconds, 2) if elapsed_seconds > 0 else 0.0
+    requests_sent = stats['submitted']
+    stats['connection_reuse_rate'] = (
+        round(max(0.0, 1 - stats['connections_opened'] / requests_sent), 3) if requests_sent else 0.0
+    )
+    stats['shards'] = len(shard_stats)
+    return stats
+
+def merge_shards(job_folder, date_stamp, shard_count, keep_loose_files=True):
+    """
+    Merges the output of shards written by run_export into job_folder/shard_<n> into one job:
+    a single zip archive, one folder of loose files and a combined manifest. The shard folders are removed.
+    Returns:
+        dict: 'zip_file_path', the number of 'lines' merged and the combined 'delta' (None for full jobs).
+    """
+    output_base_dir = os.path.join(job_folder, f"voice_files_{date_stamp}")
+    zip_file_path = os.path.join(job_folder, f'voice_files_{date_stamp}.zip')
+    manifest = []
+    delta = None
+    lines = 0
+
+    with StreamingZipWriter(zip_file_path) as archive:
+        for shard_index in range(shard_count):
+            folder = shard_folder(job_folder, shard_index)
+            shard_zip_path = os.path.join(folder, f'voice_files_{date_stamp}.zip')
+            with ZipFile(shard_zip_path) as shard_zip:
+                for name in shard_zip.namelist():
+                    if name == 'delta.json':
+                        shard_delta = json.loads(shard_zip.read(name))
+                        if delta is None:
+                            delta = {'added': [], 'changed': [], 'removed': [], 'unchanged': 0,
+                                     'base_job_id': shard_delta.get('base_job_id')}
+                        for key in ('added', 'changed', 'removed'):
+                            delta[key].extend(shard_delta[key])
+                        delta['unchanged'] += shard_delta['unchanged']
+                        continue
+                    archive.add_bytes(name, shard_zip.read(name))
+                    lines += 1
+
+            if keep_loose_files:
+                shard_output_dir = os.path.join(folder, f"voice_files_{date_stamp}")
+                for root, _, files in os.walk(shard_output_dir):
+                    for filename in files:
+                        source = os.path.join(root, filename)
+                        target = os.path.join(output_base_dir, os.path.relpath(source, shard_output_dir))
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.replace(source, target)
+
+            manifest.extend(load_manifest(folder) or [])
+
+        if delta is not None:
+            archive.add_bytes('delta.json', json.dumps(delta, indent=1))
+
+    write_manifest(job_folder, manifest)
+    for shard_index in range(shard_count):
+        shutil.rmtree(shard_folder(job_folder, shard_index), ignore_errors=True)
+    if delta is not None:
+        delta.pop('base_job_id')
+    return {'zip_file_path': zip_file_path, 'lines': lines, 'delta': delta}
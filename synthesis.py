@@ -0,0 +1,353 @@
+# synthesis.py
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from audio_cache import make_cache_key
+from audio_post import PCM_API_FORMAT
+from http_client import get_default_client
+from metrics import STAGE_SECONDS, API_RESPONSES, CHARACTERS_SYNTHESIZED, CACHE_LOOKUPS, log_event
+from rate_limit import AdaptiveLimiter, RetryPolicy, parse_retry_after
+
+# Defaults used for every text-to-speech request
+DEFAULT_API_URL = 'https://api.elevenlabs.io'
+DEFAULT_MODEL_ID = 'eleven_multilingual_v2'
+DEFAULT_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.5,
+    "style": 0.5
+}
+
+# Accept header sent for each supported output format
+ACCEPT_HEADERS = {
+    'mp3': 'audio/mpeg',
+    'ogg': 'audio/ogg',
+    'wav': 'audio/pcm',
+}
+
+# Formats written as something other than what the API returns: WAV is built from raw PCM,
+# which is what the audio cache holds for it
+API_OUTPUT_FORMATS = {'wav': PCM_API_FORMAT}
+CACHE_FORMATS = {'wav': 'pcm'}
+
+# Limiters bounding in-flight requests per API key, shared by every job using that key
+_key_limits = {}
+_key_limits_lock = threading.Lock()
+
+def get_key_limit(api_key, max_concurrency):
+    """
+    Returns the limiter that bounds concurrent requests for an API key.
+    Args:
+        api_key (str): The ElevenLabs API key.
+        max_concurrency (int): Limit applied the first time the key is seen.
+    Returns:
+        AdaptiveLimiter: The shared limiter for the key.
+    """
+    with _key_limits_lock:
+        limit = _key_limits.get(api_key)
+        if limit is None:
+            limit = AdaptiveLimiter(max_concurrency)
+            _key_limits[api_key] = limit
+        return limit
+
+def build_player_folders(player_voice_ids, output_base_dir, create_dirs=True):
+    """
+    Creates one PlayerN folder per unique Player voice, numbered in sorted voice ID order.
+    Args:
+        player_voice_ids (iterable): The Player voice IDs, e.g. from get_player_voice_ids.
+        output_base_dir (str): The job's voice_files directory.
+        create_dirs (bool): Whether to create the folders on disk.
+    Returns:
+        dict: A dictionary mapping Player voice IDs to their folder paths.
+    """
+    player_folders = {}
+    player_voices = {voice_id for voice_id in player_voice_ids if voice_id is not None}
+    for index, voice_id in enumerate(sorted(player_voices), start=1):
+        folder_path = os.path.join(output_base_dir, f"Player{index}")
+        player_folders[voice_id] = folder_path
+        if create_dirs:
+            os.makedirs(folder_path, exist_ok=True)
+    return player_folders
+
+def get_output_path(entry, output_base_dir, player_folders, date_stamp, output_format):
+    """
+    Returns the file path an entry's audio is written to.
+    Player lines go to their voice's PlayerN folder; NPC lines and Player lines
+    without a voice folder are saved directly in the main folder.
+    """
+    if entry.characterName == "Player" and entry.voiceID in player_folders:
+        folder_path = player_folders[entry.voiceID]
+    else:
+        folder_path = output_base_dir
+    audio_filename = f"{entry.getTag()}_{date_stamp}.{output_format}"
+    return os.path.join(folder_path, audio_filename)
+
+class SynthesisEngine:
+    """
+    Sends entries to the ElevenLabs text-to-speech endpoint through a bounded thread pool.
+    """
+
+    def __init__(self, api_key, output_format='ogg', api_url=DEFAULT_API_URL, max_workers=4,
+                 key_concurrency=None, model_id=DEFAULT_MODEL_ID, voice_settings=None, cache=None,
+                 retry_policy=None, http_client=None):
+        self.api_key = api_key
+        self.output_format = output_format
+        self.cache_format = CACHE_FORMATS.get(output_format, output_format)
+        self.api_url = api_url.rstrip('/')
+        self.max_workers = max(1, int(max_workers))
+        self.model_id = model_id
+        self.voice_settings = voice_settings or dict(DEFAULT_VOICE_SETTINGS)
+        self.key_limit = get_key_limit(api_key, key_concurrency or self.max_workers)
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.http_client = http_client or get_default_client()
+
+    def cache_key(self, entry):
+        """
+        Returns the audio cache key for an entry under this engine's settings.
+        """
+        return make_cache_key(entry.getCleanText(), entry.getVoiceID(), self.model_id,
+                              self.voice_settings, self.output_format)
+
+    def build_request(self, entry):
+        """
+        Builds the URL, headers and JSON body for an entry's text-to-speech request.
+        """
+        url = f"{self.api_url}/v1/text-to-speech/{entry.getVoiceID()}"
+        if self.output_format in API_OUTPUT_FORMATS:
+            url = f"{url}?output_format={API_OUTPUT_FORMATS[self.output_format]}"
+        headers = {
+            "xi-api-key": self.api_key,
+            "Accept": ACCEPT_HEADERS.get(self.output_format, 'audio/mpeg'),
+            "Content-Type": "application/json"
+        }
+        data = {
+            "text": entry.getCleanText(),
+            "model_id": self.model_id,
+            "voice_settings": self.voice_settings
+        }
+        return url, headers, data
+
+    def synthesize(self, entry):
+        """
+        Makes one text-to-speech request, waiting for a free slot on the API key.
+        Returns:
+            requests.Response: The API response.
+        """
+        url, headers, data = self.build_request(entry)
+        with self.key_limit:
+            with STAGE_SECONDS.time(stage='api'):
+                return self.http_client.post(url, json=data, headers=headers)
+
+    def _use_cached(self, entry, cached_path, on_audio, on_cached):
+        """
+        Hands a cache hit to the caller. Returns False if the file was evicted in the meantime.
+        """
+        try:
+            if on_cached is not None:
+                on_cached(entry, cached_path)
+            else:
+                with open(cached_path, 'rb') as f:
+                    on_audio(entry, f.read())
+        except FileNotFoundError:
+            return False
+        return True
+
+    def run(self, entries, on_audio, on_cached=None, on_progress=None, progress_interval=1.0):
+        """
+        Synthesizes every entry with text and a voice ID, keeping at most
+        max_workers requests in flight. Entries may be any iterable, so a
+        generator lets synthesis start before parsing has finished.
+        When the engine has a cache, hits are served without an API call.
+        Entries with the same text, voice and settings share one request:
+        a duplicate of a line still in flight waits for its result, and one
+        seen after the line finished is served from the audio kept for the
+        rest of the run, its cached file or, without a cache, its bytes. Only
+        a file the cache has evicted by then is synthesized again.
+        Rate-limited and transient failures are re-queued with backoff
+        instead of being dropped.
+        Args:
+            entries (iterable): Entry objects to synthesize.
+            on_audio (callable): Called as on_audio(entry, audio_bytes) on the calling thread for each success.
+            on_cached (callable): Called as on_cached(entry, cached_path) for each cache hit.
+                Defaults to reading the cached file and passing its bytes to on_audio.
+            on_progress (callable): Called as on_progress(stats) on the calling thread at most every
+                progress_interval seconds while the run is going, and once at the end, with the
+                counts, throughput and failed entries so far.
+            progress_interval (float): Minimum seconds between on_progress calls.
+        Returns:
+            dict: Counts, cache hits and misses, duplicates served without their own request ('deduplicated'),
+                retries, elapsed time and throughput for the run,
+                connections opened and reused on the HTTP client while it ran,
+                plus 'failed_entries' describing every entry that ultimately failed.
+        """
+        stats = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0, 'cache_hits': 0, 'cache_misses': 0,
+                 'deduplicated': 0, 'retries': 0, 'rate_limited': 0}
+        failed_entries = []
+        start_time = time.monotonic()
+        http_start = self.http_client.stats()
+        pending = {}
+        retry_queue = []  # Heap of (ready_at, sequence, entry, attempt, key)
+        duplicates = {}  # Cache key of each line in flight or awaiting retry -> entries waiting for its audio
+        finished = {}  # Cache key of each line synthesized during this run -> its cached file, or its audio bytes
+        sequence = itertools.count()
+        entries_iter = iter(entries)
+        exhausted = False
+        last_progress = start_time
+
+        def snapshot():
+            elapsed = time.monotonic() - start_time
+            return dict(stats, elapsed_seconds=round(elapsed, 3),
+                        lines_per_second=round(stats['succeeded'] / elapsed, 2) if elapsed > 0 else 0.0,
+                        failed_entries=list(failed_entries))
+
+        def report_progress():
+            nonlocal last_progress
+            if on_progress is not None and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                on_progress(snapshot())
+
+        def take_ready():
+            """
+            Returns the next (entry, attempt, key) to submit, or None if nothing is ready.
+            Retries whose backoff has elapsed go first, then new entries.
+            """
+            nonlocal exhausted
+            if retry_queue and retry_queue[0][0] <= time.monotonic():
+                _, _, entry, attempt, key = heapq.heappop(retry_queue)
+                return entry, attempt, key
+            while not exhausted:
+                entry = next(entries_iter, None)
+                if entry is None:
+                    exhausted = True
+                    break
+                if not entry.getCleanText() or not entry.getVoiceID():
+                    stats['skipped'] += 1
+                    continue  # Skip entries with no text or no voice ID
+                key = self.cache_key(entry)
+                if key in duplicates:
+                    duplicates[key].append(entry)
+                    stats['deduplicated'] += 1
+                    CACHE_LOOKUPS.inc(result='deduplicated')
+                    continue
+                if key in finished:
+                    audio = finished[key]
+                    if isinstance(audio, bytes):
+                        on_audio(entry, audio)
+                        served = True
+                    else:
+                        served = self._use_cached(entry, audio, on_audio, on_cached)
+                    if served:
+                        stats['deduplicated'] += 1
+                        stats['succeeded'] += 1
+                        CACHE_LOOKUPS.inc(result='deduplicated')
+                        report_progress()
+                        continue
+                    del finished[key]  # Evicted from the cache, so it is synthesized again
+                if self.cache is not None:
+                    cached_path = self.cache.lookup(key, self.cache_format)
+                    if cached_path and self._use_cached(entry, cached_path, on_audio, on_cached):
+                        stats['cache_hits'] += 1
+                        CACHE_LOOKUPS.inc(result='hit')
+                        stats['succeeded'] += 1
+                        report_progress()
+                        continue
+                    stats['cache_misses'] += 1
+                    CACHE_LOOKUPS.inc(result='miss')
+                duplicates[key] = []
+                return entry, 0, key
+            return None
+
+        def collect(done):
+            for future in done:
+                entry, attempt, key = pending.pop(future)
+                retry_after = None
+                try:
+                    response = future.result()
+                except requests.RequestException as e:
+                    status_code, error = None, str(e)
+                    API_RESPONSES.inc(status='error')
+                else:
+                    API_RESPONSES.inc(status=response.status_code)
+                    if response.status_code == 200:
+                        self.key_limit.record_success()
+                        CHARACTERS_SYNTHESIZED.inc(len(entry.getCleanText()))
+                        cached_path = None
+                        if self.cache is not None:
+                            cached_path = self.cache.put(key, self.cache_format, response.content)
+                        finished[key] = cached_path or response.content
+                        on_audio(entry, response.content)
+                        stats['succeeded'] += 1
+                        # Duplicates get the same audio under their own entrytags
+                        for duplicate in duplicates.pop(key):
+                            if not (cached_path and self._use_cached(duplicate, cached_path, on_audio, on_cached)):
+                                on_audio(duplicate, response.content)
+                            stats['succeeded'] += 1
+                        continue
+                    status_code, error = response.status_code, response.text
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if status_code == 429:
+                        stats['rate_limited'] += 1
+                        self.key_limit.record_throttle()
+
+                if self.retry_policy.should_retry(status_code, attempt):
+                    delay = self.retry_policy.delay(attempt, retry_after)
+                    heapq.heappush(retry_queue, (time.monotonic() + delay, next(sequence), entry, attempt + 1, key))
+                    stats['retries'] += 1
+                    log_event('synthesis_retry', f"Retrying entry {entry.getTag()} in {delay:.1f}s after {status_code or error}",
+                              entrytag=entry.getTag(), status_code=status_code, attempt=attempt + 1, delay=round(delay, 3))
+                else:
+                    # Log the error and record the entry, and any duplicates waiting on it, as failed
+                    for failed in [entry] + duplicates.pop(key):
+                        stats['failed'] += 1
+                        failed_entries.append({
+                            'entrytag': failed.getTag(),
+                            'voiceID': failed.getVoiceID(),
+                            'status_code': status_code,
+                            'error': error[:500],
+                            'attempts': attempt + 1
+                        })
+                    log_event('synthesis_failed', f"Error generating audio for entry {entry.getTag()}: {status_code}, {error}",
+                              entrytag=entry.getTag(), status_code=status_code, error=error[:500], attempts=attempt + 1)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(pending) < self.max_workers:
+                    item = take_ready()
+                    if item is None:
+                        break
+                    entry, attempt, key = item
+                    pending[executor.submit(self.synthesize, entry)] = (entry, attempt, key)
+                    stats['submitted'] += 1
+
+                if pending:
+                    timeout = max(0.0, retry_queue[0][0] - time.monotonic()) if retry_queue else None
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    collect(done)
+                    report_progress()
+                elif retry_queue:
+                    # Only delayed retries remain, so wait for the earliest one
+                    time.sleep(max(0.0, retry_queue[0][0] - time.monotonic()))
+                elif exhausted:
+                    break
+
+        elapsed = time.monotonic() - start_time
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['lines_per_second'] = round(stats['succeeded'] / elapsed, 2) if elapsed > 0 else 0.0
+        # The client is shared, so these include requests made by other jobs running at the same time
+        http_end = self.http_client.stats()
+        http_requests = http_end['requests'] - http_start['requests']
+        stats['connections_opened'] = http_end['connections_opened'] - http_start['connections_opened']
+        stats['connection_reuse_rate'] = (
+            round(max(0.0, 1 - stats['connections_opened'] / http_requests), 3) if http_requests else 0.0
+        )
+        stats['failed_entries'] = failed_entries
+        if on_progress is not None:
+            on_progress(dict(stats, failed_entries=list(failed_entries)))
+        return stats
@@ -0,0 +1,94 @@
+# text_cleaner.py
+
+import json
+import os
+import re
+
+# Cleaning rules shipped with the app; edit this file to add placeholders or replacements
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cleaning_rules.json')
+
+def load_cleaning_rules(rules_path=DEFAULT_RULES_PATH):
+    """
+    Reads cleaning rules from a JSON file.
+    Args:
+        rules_path (str): Path to a JSON file with 'remove' (list of literal strings),
+            'replace' (ordered mapping of literal strings to replacements) and
+            'remove_patterns' (list of regular expressions) keys.
+    Returns:
+        dict: The rules, with missing keys filled with empty values.
+    """
+    with open(rules_path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    return {
+        'remove': rules.get('remove', []),
+        'replace': rules.get('replace', {}),
+        'remove_patterns': rules.get('remove_patterns', []),
+    }
+
+def _literal_guard(items):
+    """
+    Compiles a regular expression finding any of the literal strings, or returns None if there are none.
+    The strings are grouped by their first character, so the regex engine can skip straight to candidate characters.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(item[:1], set()).add(re.escape(item[1:]))
+    if not groups:
+        return None
+    return re.compile('|'.join(re.escape(first) + '(?:' + '|'.join(sorted(rests)) + ')'
+                               for first, rests in groups.items()))
+
+class TextCleaner:
+    """
+    Cleans dialogue text by applying every removal, then every replacement, then
+    every pattern, in order.
+
+    Most lines contain none of a stage's rules, so each stage first looks for
+    any of them with one regular expression compiled from the rules, and skips
+    the stage when there is none. Lines that do contain one go through the stage
+    rule by rule, so where one rule's output forms another rule's text ('T*K'
+    becoming 'TK', then 'Tea Kay') the result is the same as applying each rule
+    in turn.
+    """
+
+    def __init__(self, remove_items, replace_items, remove_patterns):
+        self._remove_items = list(remove_items)
+        self._replace_items = list(replace_items.items())
+        self._patterns = [re.compile(pattern) for pattern in remove_patterns]
+
+        self._removal_guard = _literal_guard(self._remove_items)
+        self._replace_guard = _literal_guard(replace_items)
+        self._pattern_guard = re.compile('|'.join(f"(?:{pattern})" for pattern in remove_patterns)) \
+            if remove_patterns else None
+
+    @classmethod
+    def from_file(cls, rules_path=DEFAULT_RULES_PATH):
+        rules = load_cleaning_rules(rules_path)
+        return cls(rules['remove'], rules['replace'], rules['remove_patterns'])
+
+    def clean(self, dialogueText):
+        """
+        Cleans the dialogue text by removing unwanted items and replacing specified items.
+        Arg: dialogueText (str)
+        Returns: The cleaned dialogue text.
+        """
+        if not dialogueText:
+            return ''
+
+        # Remove unwanted items
+        if self._removal_guard and self._removal_guard.search(dialogueText):
+            for item in self._remove_items:
+                dialogueText = dialogueText.replace(item, '')
+
+        # Replace specified items
+        if self._replace_guard and self._replace_guard.search(dialogueText):
+            for old, new in self._replace_items:
+                dialogueText = dialogueText.replace(old, new)
+
+        # Remove any remaining placeholders or tags
+        if self._pattern_guard and self._pattern_guard.search(dialogueText):
+            for pattern in self._patterns:
+                dialogueText = pattern.sub('', dialogueText)
+
+        # Normalize whitespace
+        return ' '.join(dialogueText.split())
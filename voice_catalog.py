@@ -0,0 +1,69 @@
+# voice_catalog.py
+
+import hashlib
+import threading
+import time
+
+import requests
+
+class VoiceCatalog:
+    """
+    Voices available to each API key, fetched from /v1/voices and kept for ttl seconds so logins
+    and uploads within that window do not repeat the round-trip.
+    """
+
+    def __init__(self, http_client, api_url, ttl=600.0):
+        """
+        Args:
+            http_client (HTTPClient): The shared client used for ElevenLabs calls.
+            api_url (str): Base URL of the ElevenLabs API.
+            ttl (float): Seconds a fetched catalog is reused before it is fetched again.
+        """
+        self.http_client = http_client
+        self.api_url = api_url.rstrip('/')
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._catalogs = {}  # Hash of the API key -> (fetched_at, {voice_id: name})
+
+    def get(self, api_key, refresh=False):
+        """
+        Returns the voices available to an API key as a dictionary of voice ID to name.
+        Raises:
+            requests.HTTPError: If ElevenLabs rejects the key.
+            requests.RequestException: If ElevenLabs cannot be reached or its answer cannot be read.
+        """
+        key = self._key(api_key)
+        with self._lock:
+            cached = self._catalogs.get(key)
+        if cached is not None and not refresh and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        response = self.http_client.get(f"{self.api_url}/v1/voices", headers={"xi-api-key": api_key})
+        response.raise_for_status()
+        try:
+            voices = {voice['voice_id']: voice.get('name') for voice in response.json().get('voices', [])}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise requests.RequestException(f"Could not read the voices returned by ElevenLabs: {e}",
+                                            response=response) from e
+        with self._lock:
+            self._catalogs[key] = (time.monotonic(), voices)
+        return voices
+
+    def find_unknown(self, api_key, voice_ids):
+        """
+        Returns the voice IDs an API key cannot use, checking them all at once. A cached catalog is
+        fetched again before reporting a voice unknown, in case the voice was added since.
+        """
+        voice_ids = set(voice_ids)
+        unknown = voice_ids - self.get(api_key).keys()
+        if unknown:
+            unknown -= self.get(api_key, refresh=True).keys()
+        return sorted(unknown)
+
+    def invalidate(self, api_key):
+        with self._lock:
+            self._catalogs.pop(self._key(api_key), None)
+
+    def _key(self, api_key):
+        # Catalogs are held by a hash so the keys themselves are not kept in memory
+        return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
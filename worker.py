@@ -0,0 +1,21 @@
+# worker.py
+#
+# Runs job workers without serving the web app, so more processes (or hosts sharing the job database,
+# upload folder and audio cache) take part in processing queued jobs and the shards of large ones.
+#
+#   JOB_WORKERS=4 RESUME_INTERRUPTED_JOBS=0 JWT_SECRET_KEY=... python worker.py
+#
+# JWT_SECRET_KEY must match the web app's, since jobs carry the uploader's token.
+
+import time
+
+from app import job_queue
+
+if __name__ == "__main__":
+    job_queue.start()
+    print(f"Processing queued jobs with {job_queue.num_workers} worker(s). Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass